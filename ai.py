@@ -2,57 +2,46 @@
 Work ongoing
 this doesn't do anything yet rather than solving it brute-force.
 """
-import itertools
 #import random
 #import tensorflow
 
-from mastermind2 import PEGS, get_response
+from mastermind2 import CLASSIC, CodeSet, GameSession
+from gamelog import GameLog
 
-# All possible guesses, in the format 'rgbc':
-ALL_GUESSES = set(itertools.product(PEGS, repeat=4))
+SPEC = CLASSIC
 
-# Stack of guesses and reponses of a round of the game.
-# The responses are a tuple (blacks, whites).
-GUESSES = []
-RESPONSES = []
 
-
-def get_next_guess_ai():
-    """Here AI should consider all previous GUESSES and
-    RESPONSES and come up with the next guess.
+def get_next_guess_ai(session):
+    """Here AI should consider all previous guesses and
+    responses of the session and come up with the next guess.
     """
-    return ''.join(ALL_GUESSES.pop())
+    unused = CodeSet(SPEC)
+    for g in session.guesses:
+        unused.discard(g)
+    return SPEC.decode(next(iter(unused)))
 	
 	
-def mastermind(code='ycmb', verbose=False):
-    """AI is the code breaker.
+def mastermind(code='ycmb', verbose=False, log=None):
+    """AI is the code breaker. Returns the `GameSession` played,
+    logged to the `GameLog` `log` if given.
     """
-    global GUESSES, RESPONSES
-    
-    S = list(itertools.product(PEGS, repeat=4))
-    T = S[:]
-    guess = get_next_guess_ai()
+    session = GameSession(SPEC, code, log=log)
     count = 0
     while True:
         count += 1
-        resp = get_response(guess, code)
-        
-        GUESSES.append(guess)
-        RESPONSES.append(resp)
+        guess = get_next_guess_ai(session)
+        resp = session.submit_guess(guess)
         
         blacks, whites = resp
         if verbose:
             print(f'[{count}] {guess=} -> {blacks=}, {whites=}', end='\r')
-        if blacks == 4:
+        if session.solved:
             print(f'The code is {guess}.')
-            return count
-        guess = get_next_guess_ai()
-        assert guess is not None
+            return session
 
 
 if __name__ == '__main__':
-    print(f'Solved in {mastermind()} guesses')
-   
-    with open('last_game.txt', 'w') as f:
-        for i, (g, r) in enumerate(zip(GUESSES, RESPONSES)):
-            f.write(f'{i}, {g}, {r}\n')
+    log = GameLog('last_game.jsonl')
+    session = mastermind(log=log)
+    log.close()
+    print(f'Solved in {len(session)} guesses')
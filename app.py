@@ -11,19 +11,100 @@ from PyQt5 import QtCore, QtWidgets
 from PyQt5.QtGui import QPainter, QColor
 from PyQt5 import QtTest
 
+import os
 import copy
 import time
-import itertools
 
 import mastermind2 as mm
+from strategy_tree import StrategyTree
+from cache import GuessCache
+from gamelog import GameLog
 
-PEGS = "orgbcmyo"
 RESP = "owko"
 
+# Strategy tree followed by the computer if the file exists,
+# see strategy_tree.py
+TREE_FILE = "knuth_tree.json"
+
+# Cache of the computer guesses, reused across sessions, see cache.py
+CACHE_FILE = "guesses.cache"
+
+# Log of the games played, see gamelog.py
+LOG_FILE = "games.jsonl"
+
+# Seconds the computer thinks per guess before playing the best found
+TIME_BUDGET = 2.0
+
+
+class Cancelled(Exception):
+    """Raised from the progress callback to stop a `SolverTask`."""
+
+
+class SolverSignals(QtCore.QObject):
+    """Signals of a `SolverTask`, all carrying the task generation.
+
+    finished: generation, game session and its next guess, None if no
+    code is consistent with the responses.
+    progress: generation, guesses scored and total guesses to score.
+    cancelled: generation.
+    """
+    finished = QtCore.pyqtSignal(int, object, object)
+    progress = QtCore.pyqtSignal(int, int, int)
+    cancelled = QtCore.pyqtSignal(int)
+
+
+class SolverTask(QtCore.QRunnable):
+    """Compute the next guess of a copy of a `mm.GameSession`, off the
+    Qt event thread. The copy, with S and T pruned, is returned along
+    with the guess.
+
+    The result is delivered through `signals`, queued to the thread of
+    the window. `cancel` makes the task stop at its next progress
+    report.
+    """
+
+    def __init__(self, generation, session):
+        super().__init__()
+        self.generation = generation
+        self.session = session.copy()
+        self.signals = SolverSignals()
+        self._cancelled = False
+
+    def cancel(self):
+        self._cancelled = True
+
+    def progress(self, done, total):
+        if self._cancelled:
+            raise Cancelled()
+        self.signals.progress.emit(self.generation, done, total)
+
+    def run(self):
+        try:
+            guess = self.session.next_guess(progress=self.progress)
+        except Cancelled:
+            self.signals.cancelled.emit(self.generation)
+            return
+        self.signals.finished.emit(self.generation, self.session, guess)
+
 
 class Window(QtWidgets.QWidget):
-    def __init__(self):
+    def __init__(self, spec=mm.CLASSIC, tree=None, cache=None, log=None,
+                 time_budget=None):
         QtWidgets.QWidget.__init__(self)
+        self.spec = spec
+        self.tree = tree
+        self.cache = cache
+        self.log = log
+        self.time_budget = time_budget
+        # Colours cycled through when clicking a peg, "o" is an empty peg
+        self.pegs = "o" + spec.colours + "o"
+        # The solver runs one task at a time, so that the guess cache
+        # is only used by one thread. A cancelled task stops early.
+        self.pool = QtCore.QThreadPool(self)
+        self.pool.setMaxThreadCount(1)
+        self.task = None
+        # Incremented on reset, results of older tasks are ignored
+        self.generation = 0
         self.initUI()
 
     def initUI(self):
@@ -39,21 +120,34 @@ class Window(QtWidgets.QWidget):
         #   "keeper": user is the code keeper. The computer tries to break the code.
         self.game_mode = "breaker"
 
+        # How the computer scores its guesses, press S to switch
+        self.strategy = "minimax"
+
         self.reset()
         self.show()
         self.help()
 
     def reset(self):
+        self.cancel_task()
+        self.generation += 1
+        if hasattr(self, "session"):
+            self.session.end()
         self.active_row = 0
         self.count = 0
 
-        self.code = "cymb"
+        n = self.spec.positions
+        self.code = "cymb" if self.spec == mm.CLASSIC else self.spec.random_code()
 
-        self.guesses = [list("rrgg")]
-        self.guesses.extend([list("oooo") for _ in range(11)])
-        self.responses = [list("oooo") for _ in range(12)]
-        self.S = list(itertools.product(mm.PEGS, repeat=4))
-        self.T = self.S[:]
+        first_guess = self.spec.default_guess()
+        if self.tree is not None and self.tree.strategy == self.strategy:
+            first_guess = self.tree.first_guess
+        self.guesses = [list(first_guess)]
+        self.guesses.extend([list("o" * n) for _ in range(11)])
+        self.responses = [list("o" * n) for _ in range(12)]
+        # moves played, whatever the game mode
+        self.session = mm.GameSession(self.spec, tree=self.tree,
+                                      cache=self.cache, log=self.log,
+                                      time_budget=self.time_budget)
 
     def help(self):
         msg = ('Mastermind \n\n'
@@ -61,20 +155,28 @@ class Window(QtWidgets.QWidget):
                ' A: auto - computer vs computer\n'
                ' B: breaker - you are the code braker.\n'
                ' K: keeper - you are the code keeper.\n\n'
+               'Press S to switch the computer strategy.\n\n'
                'Switch between colors by clicking the pegs.\n\n'
                'If you are the code breaker, click on the bigger pegs\n'
                'until all 4 have a set color.\n\n'
                'If you are the code keeper, click on the smaller pegs\n'
                'to give feedback on the code pegs.\n\n'
-               ' Play the next round by pressing P\n\n'
+               ' Play the next round by pressing P\n'
+               ' Take back the last round by pressing U\n\n'
                'To show this help, press H'
         )
         box = QtWidgets.QMessageBox(QtWidgets.QMessageBox.Information, 'Help', msg)
         box.exec()
         
     def play(self):
+        if self.task is not None:
+            print("The computer is thinking.")
+            return
+
         if self.game_mode == "auto":
-            self.computer_guess()
+            if self.computer_guess():
+                # the rest of the move is done by guess_ready
+                return
             resp = self.computer_response()
             if self.check_won(resp):
                 return
@@ -92,6 +194,15 @@ class Window(QtWidgets.QWidget):
             if not resp:
                 print("Invalid response. Try again.")
                 return
+            guess = "".join(self.guesses[self.active_row])
+            possible = self.session.possible_responses(guess)
+            if resp not in possible:
+                print("This response contradicts the previous ones. "
+                      "Possible blacks/whites:",
+                      ", ".join(f"{b}/{w}" for b, w in possible))
+                print("Fix it, or press U to take back the last round.")
+                return
+            self.submit(resp)
             if self.check_won(resp):
                 return
             self.active_row += 1
@@ -102,39 +213,90 @@ class Window(QtWidgets.QWidget):
         self.active_row += 1
         self.update()
 
+    def undo(self):
+        """Take back the last round, to fix a guess or a response."""
+        if self.game_mode == "auto" or self.active_row <= 0:
+            return
+        self.cancel_task()
+        self.generation += 1
+        self.session.undo()
+        if self.game_mode == "keeper":
+            # guess of the computer for the round taken back
+            self.guesses[self.active_row] = list("o" * self.spec.positions)
+        self.active_row -= 1
+        self.responses[self.active_row] = list("o" * self.spec.positions)
+
     def check_won(self, resp):
-        blacks, whites = resp
-        if blacks == 4:
+        if self.spec.is_solved(resp):
             print(f"The code is {''.join(self.guesses[self.active_row])}/{self.code}.")
             self.active_row = -1
             return True
         return False
 
+    def submit(self, resp):
+        """Play the guess of the active row, which got `resp`."""
+        self.session.submit_guess("".join(self.guesses[self.active_row]))
+        self.session.submit_response(resp)
+
     def human_guess(self):
         """Validate a user input guess"""
         assert self.game_mode == "breaker"
         g = "".join(self.guesses[self.active_row])
-        return len(g) == 4 and set(g).issubset(set(mm.PEGS))
+        return self.spec.is_valid_guess(g)
 
     def computer_guess(self):
+        """Set the computer guess of the active row. Return True if it
+        is being computed by a `SolverTask`, see `guess_ready`."""
         assert self.game_mode in {"auto", "keeper"}
 
         if self.active_row == 0:
+            return False
+
+        # The session follows the strategy tree if it was built for
+        # this strategy, S and T are only pruned if the game leaves it.
+        self.session.strategy = self.strategy
+        task = SolverTask(self.generation, self.session)
+        task.signals.finished.connect(self.guess_ready)
+        task.signals.progress.connect(self.guess_progress)
+        task.signals.cancelled.connect(self.guess_cancelled)
+        self.task = task
+        self.thinking = 0.0
+        self.pool.start(task)
+        return True
+
+    def guess_ready(self, generation, session, guess):
+        if generation != self.generation:
             return
-
-        last_guess = "".join(self.guesses[self.active_row - 1])
-        resp_str = self.responses[self.active_row - 1]
-        resp = resp_str.count("k"), resp_str.count("w")
-        mm.prune(self.S, self.T, last_guess, resp, verbose=False)
+        self.task = None
+        self.session = session
 
         # check if S is not empty
-        if not self.S:
+        if guess is None:
             print('WARNING: S has become empty.')
             self.active_row = -1
+            self.update()
             return
-        
-        next_guess = self.guesses[self.active_row]
-        next_guess[:] = mm.get_next_guess(self.S, self.T, verbose=False)
+
+        self.guesses[self.active_row][:] = guess
+        if self.game_mode == "auto":
+            resp = self.computer_response()
+            if not self.check_won(resp):
+                self.active_row += 1
+        self.update()
+
+    def guess_progress(self, generation, done, total):
+        if generation != self.generation or not total:
+            return
+        self.thinking = done / total
+        self.update()
+
+    def guess_cancelled(self, generation):
+        print("Computer guess cancelled.")
+
+    def cancel_task(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
 
     def human_response(self):
         """Validate a user input response"""
@@ -142,14 +304,8 @@ class Window(QtWidgets.QWidget):
 
         resp_str = self.responses[self.active_row]
         resp = resp_str.count("k"), resp_str.count("w")
-        blacks, whites = resp
-        if (
-            0 <= blacks <= 4
-            and 0 <= whites <= 4
-            and whites + blacks <= 4
-            and not (blacks == 3 and whites == 1)
-        ):
-            return blacks, whites
+        if self.spec.is_valid_response(resp):
+            return resp
         return False
 
     def computer_response(self):
@@ -158,9 +314,11 @@ class Window(QtWidgets.QWidget):
         guess = "".join(self.guesses[self.active_row])
         resp = mm.get_response(guess, self.code)
         blacks, whites = resp
-        self.responses[self.active_row] = (
-            "k" * blacks + "w" * whites + "o" * (4 - blacks - whites)
+        self.responses[self.active_row] = list(
+            "k" * blacks + "w" * whites
+            + "o" * (self.spec.positions - blacks - whites)
         )
+        self.submit(resp)
         return blacks, whites
 
     def old_play_old(self):
@@ -232,12 +390,15 @@ class Window(QtWidgets.QWidget):
         self.pegs_pad = 10
         # response padding
         self.resp_pad = 5
-        # size of each square box with the pegs
-        self.box_size = self.w // 5
+        # size of each square box with the pegs, one per position plus
+        # one for the response pegs
+        self.box_size = self.w // (self.spec.positions + 1)
         # size of the pegs
         self.peg_size = self.box_size - 2 * self.pegs_pad
+        # response pegs are drawn in 2 rows
+        self.resp_cols = (self.spec.positions + 1) // 2
         # size of each reponse peg
-        self.response_size = self.box_size // 2 - 2 * self.resp_pad
+        self.response_size = self.box_size // max(2, self.resp_cols) - 2 * self.resp_pad
         #print(f"{self.peg_size=}, {self.response_size=}")
 
     def resizeEvent(self, event):
@@ -250,7 +411,7 @@ class Window(QtWidgets.QWidget):
     def mouse_clicked(self, event):
         #print("mouse_clicked() called")
 
-        if self.game_mode == "auto":
+        if self.game_mode == "auto" or self.task is not None:
             return
 
         x = event.pos().x()
@@ -261,18 +422,23 @@ class Window(QtWidgets.QWidget):
         if not row == self.active_row or self.active_row == -1:
             return
 
-        if self.game_mode == "breaker" and col < 4:
+        n = self.spec.positions
+        if self.game_mode == "breaker" and col < n:
             # switch between the colors
             #print(f"clicked round {row+1}, peg {col+1}")
-            self.guesses[row][col] = PEGS[PEGS.find(self.guesses[row][col]) + 1]
+            pegs = self.pegs
+            self.guesses[row][col] = pegs[pegs.find(self.guesses[row][col]) + 1]
             #print(f"{''.join(self.guesses[row])}")
 
-        elif self.game_mode == "keeper" and col == 4:
-            xi = x - 4 * self.box_size
+        elif self.game_mode == "keeper" and col == n:
+            xi = x - n * self.box_size
             yi = y - self.active_row * self.box_size
-            coli = xi // (self.box_size // 2)
+            step = self.box_size // max(2, self.resp_cols)
+            coli = xi // step
             rowi = yi // (self.box_size // 2)
-            idx = int(coli + 2 * rowi)
+            idx = int(coli + self.resp_cols * rowi)
+            if coli >= self.resp_cols or idx >= n:
+                return
             #print(f"clicked response {row+1}, peg {idx+1}")
             self.responses[row][idx] = RESP[RESP.find(self.responses[row][idx]) + 1]
 
@@ -295,8 +461,14 @@ class Window(QtWidgets.QWidget):
             self.game_mode = "keeper"
         elif e.key() == QtCore.Qt.Key_B:
             self.game_mode = "breaker"
+        elif e.key() == QtCore.Qt.Key_U:
+            self.undo()
         elif e.key() == QtCore.Qt.Key_H:
             self.help()
+        elif e.key() == QtCore.Qt.Key_S:
+            names = list(mm.STRATEGIES)
+            self.strategy = names[(names.index(self.strategy) + 1) % len(names)]
+            print(f"Strategy: {self.strategy}")
         self.update()
 
     def paintEvent(self, e):
@@ -319,6 +491,8 @@ class Window(QtWidgets.QWidget):
             "c": QtCore.Qt.cyan,
             "y": QtCore.Qt.yellow,
             "m": QtCore.Qt.magenta,
+            "w": QtCore.Qt.white,
+            "p": QtCore.Qt.darkMagenta,
         }
         responses_colors = {
             "o": QtCore.Qt.gray,
@@ -349,27 +523,34 @@ class Window(QtWidgets.QWidget):
             y = row * self.box_size + self.pegs_pad
             s = self.peg_size
             # draw the guesses pegs
-            for col in range(4):
+            for col in range(self.spec.positions):
                 x = col * self.box_size + self.pegs_pad    
                 qp.setBrush(colors[guess[col]])
                 qp.drawEllipse(x, y, s, s)
 
-            x = 4 * self.box_size
+            x = self.spec.positions * self.box_size
             y = row * self.box_size
             s = self.response_size
+            step = self.box_size // max(2, self.resp_cols)
             i = 0
             # draw the response pegs
             for r in range(2):
                 y1 = y + r * self.box_size // 2 + self.resp_pad
-                for c in range(2):
-                    x1 = x + c * self.box_size // 2 + self.resp_pad   
+                for c in range(self.resp_cols):
+                    if i == self.spec.positions:
+                        break
+                    x1 = x + c * step + self.resp_pad   
                     qp.setBrush(responses_colors[response[i]])
                     qp.drawEllipse(x1, y1, s, s)
                     i += 1
                     
         qp.fillRect(0, h - 12, w, h, QtCore.Qt.white)
-        if self.active_row >= 0:
-            qp.drawText(10, h - 2, f"Game mode: {self.game_mode}")
+        if self.task is not None:
+            qp.drawText(10, h - 2,
+                        f"Thinking... {self.thinking:.0%} (R to cancel)")
+        elif self.active_row >= 0:
+            qp.drawText(10, h - 2,
+                        f"Game mode: {self.game_mode}, {self.strategy}")
         else:
             qp.drawText(10, h - 2, f"Game over. Press 'R' to reset.")
 
@@ -378,7 +559,18 @@ if __name__ == "__main__":
     import sys
 
     app = QtWidgets.QApplication(sys.argv)
-    window = Window()
+    tree = None
+    if os.path.exists(TREE_FILE):
+        tree = StrategyTree.load(TREE_FILE)
+    cache = GuessCache(filename=CACHE_FILE)
+    log = GameLog(LOG_FILE)
+    window = Window(tree=tree, cache=cache, log=log, time_budget=TIME_BUDGET)
     # window.resize(640, 480)
     window.show()
-    sys.exit(app.exec_())
+    status = app.exec_()
+    window.cancel_task()
+    window.pool.waitForDone()
+    window.session.end()
+    log.close()
+    cache.save()
+    sys.exit(status)
@@ -0,0 +1,152 @@
+"""
+Batch solver: break many codes at once, spread over several processes.
+
+Codes are read one per line from a file, or from stdin with '-', and
+the result of each game is written as one JSON object per line:
+
+    python batch.py codes.txt -t -o results.jsonl
+
+The response table, strategy tree or guess cache, is built once in the
+main process and handed to each worker when it starts, rather than
+rebuilt per process or sent with every task. Workers start from the
+guess cache file, if given, but only update it when running in the
+main process (`-j 0`).
+"""
+
+import os
+import sys
+import json
+import argparse
+import itertools
+from collections import deque
+from concurrent.futures import (
+    ProcessPoolExecutor, wait, FIRST_COMPLETED)
+
+import mastermind2 as mm
+
+
+def solve(code, spec=mm.CLASSIC, **kwargs):
+    """Break a single code and return the game as a dict.
+
+    Extra keyword arguments are passed to `mastermind2.mastermind`.
+    """
+    if not spec.is_valid_guess(code):
+        return {'code': code, 'error': 'invalid code'}
+    result = mm.mastermind(code=code, spec=spec, quiet=True, **kwargs)
+    return {
+        'code': code,
+        'guesses': result.guesses,
+        'responses': result.responses,
+        'count': len(result.guesses),
+        'solved': spec.is_solved(result.responses[-1]),
+    }
+
+
+def _solve_chunk(codes):
+    return [solve(code, mm.WORKER['spec'], **mm.WORKER['options'])
+            for code in codes]
+
+
+def solve_batch(codes, spec=mm.CLASSIC, workers=None, chunksize=64,
+                ordered=True, **kwargs):
+    """Break every code of the iterable `codes`, yielding one dict per
+    game as returned by `solve`.
+
+    Games are solved by `workers` processes, in chunks of `chunksize`
+    codes, by default one process per CPU. With `workers=0` everything
+    runs in the current process. Results come in the order of `codes`
+    if `ordered`, otherwise as soon as each chunk is done.
+
+    Codes are consumed lazily and only a few chunks per worker are in
+    flight at once, so `codes` can be a long stream.
+
+    Extra keyword arguments are passed to `mastermind2.mastermind`, and
+    shared with the workers once when they start.
+    """
+    codes = iter(codes)
+    if workers == 0:
+        for code in codes:
+            yield solve(code, spec, **kwargs)
+        return
+
+    workers = workers or os.cpu_count()
+    max_pending = 2 * workers
+    with ProcessPoolExecutor(workers, initializer=mm.init_worker,
+                             initargs=(spec, kwargs)) as pool:
+        pending = deque()
+        while True:
+            for chunk in iter(lambda: list(itertools.islice(codes, chunksize)),
+                              []):
+                pending.append(pool.submit(_solve_chunk, chunk))
+                if len(pending) >= max_pending:
+                    break
+            if not pending:
+                return
+            if ordered:
+                yield from pending.popleft().result()
+            else:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    pending.remove(future)
+                    yield from future.result()
+
+
+def read_codes(f):
+    for line in f:
+        code = line.strip()
+        if code:
+            yield code
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Break a batch of codes using several processes.')
+    parser.add_argument('codes', type=str,
+                        help="File with one code per line, '-' for stdin.")
+    parser.add_argument('-o', '--output', type=str, default='-',
+                        help="Output JSON lines file, '-' for stdout.")
+    parser.add_argument('-j', '--workers', type=int, default=None,
+                        help='Number of worker processes, one per CPU '
+                             'by default.')
+    parser.add_argument('--chunksize', type=int, default=64,
+                        help='Number of codes sent to a worker at once.')
+    parser.add_argument('--unordered', action='store_const',
+                        help='Write the results as soon as they are done.',
+                        const=True, default=False)
+    mm.add_solver_arguments(parser)
+    parser.add_argument('-i', '--incremental', action='store_const',
+                        help='Narrow the responses across turns.',
+                        const=True, default=False)
+    parser.add_argument('--cache', type=str, default=None,
+                        help='Guess cache file, see cache.py.')
+    parser.add_argument('--log', type=str, default=None,
+                        help='Append the games to this log file, see '
+                             'gamelog.py.')
+    parser.add_argument('--profile', type=str, default=None,
+                        help='Dump cProfile statistics to this file. '
+                             'Only the main process is profiled, use '
+                             'with -j 0 to profile the solver.')
+    args = parser.parse_args()
+
+    spec, kwargs = mm.solver_options(args)
+    kwargs['incremental'] = args.incremental
+    if args.cache:
+        from cache import GuessCache
+        kwargs['cache'] = GuessCache(filename=args.cache)
+    if args.log:
+        from gamelog import GameLog
+        kwargs['log'] = GameLog(args.log)
+
+    fin = sys.stdin if args.codes == '-' else open(args.codes)
+    fout = sys.stdout if args.output == '-' else open(args.output, 'w')
+    with fin, fout, mm.profile(args.profile):
+        results = solve_batch(read_codes(fin), spec, args.workers,
+                              args.chunksize, not args.unordered, **kwargs)
+        for result in results:
+            fout.write(json.dumps(result) + '\n')
+    if args.cache and args.workers == 0:
+        kwargs['cache'].save()
+
+
+if __name__ == '__main__':
+    main()
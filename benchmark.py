@@ -0,0 +1,150 @@
+"""
+Benchmark of the Mastermind solver.
+
+Plays `mastermind2.mastermind` against every code of the board and
+reports the distribution of the number of guesses, the wall time and
+the latency of the computer moves. Results are also written as JSON,
+to compare solver versions and backends on the same workload:
+
+    python benchmark.py --backend numpy -o numpy.json
+    python benchmark.py --tree knuth_tree.json -o tree.json
+"""
+
+import sys
+import json
+import time
+import platform
+import argparse
+import subprocess
+from collections import Counter
+
+import mastermind2 as mm
+
+
+def percentile(values, p):
+    """Nearest-rank percentile of a sorted list."""
+    if not values:
+        return None
+    k = max(0, min(len(values) - 1, round(p / 100 * len(values)) - 1))
+    return values[k]
+
+
+def git_revision():
+    try:
+        out = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'],
+                             capture_output=True, text=True, check=True)
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def benchmark(spec=mm.CLASSIC, codes=None, **kwargs):
+    """Solve every code in `codes`, all codes of `spec` by default.
+
+    Extra keyword arguments are passed to `mastermind2.mastermind`.
+    Returns a dict with the summary statistics and the number of
+    guesses per code.
+    """
+    if codes is None:
+        codes = [spec.decode(i) for i in range(spec.num_codes)]
+
+    games = {}
+    move_times = []
+    turns = []
+    start = time.perf_counter()
+    for code in codes:
+        result = mm.mastermind(code=code, spec=spec, quiet=True,
+                               on_turn=turns.append, **kwargs)
+        solved = spec.is_solved(result.responses[-1])
+        games[code] = len(result.guesses) if solved else None
+        move_times.extend(result.move_times)
+    wall_time = time.perf_counter() - start
+
+    counts = [n for n in games.values() if n is not None]
+    move_times.sort()
+    return {
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'board': {'positions': spec.positions, 'colours': spec.colours},
+        'settings': {
+            k: v if isinstance(v, (str, int, float, bool)) else type(v).__name__
+            for k, v in kwargs.items()
+        },
+        'games': len(games),
+        'unsolved': len(games) - len(counts),
+        'distribution': dict(sorted(Counter(counts).items())),
+        'mean': sum(counts) / len(counts) if counts else None,
+        'worst': max(counts, default=None),
+        'wall_time': wall_time,
+        'moves': len(move_times),
+        'move_latency': {
+            f'p{p}': percentile(move_times, p) for p in (50, 90, 99, 100)
+        },
+        'turns': {
+            'prune_time': sum(t.prune_time for t in turns),
+            'score_time': sum(t.score_time for t in turns),
+            'prune_evaluations': sum(t.prune_evaluations for t in turns),
+            'score_evaluations': sum(t.score_evaluations for t in turns),
+            'sources': dict(Counter(t.source for t in turns)),
+            'truncated': sum(t.evaluated < 1 for t in turns),
+        },
+        'guesses': games,
+    }
+
+
+def report(stats, file=sys.stdout):
+    print(f"Solved {stats['games'] - stats['unsolved']}/{stats['games']} "
+          f"codes in {stats['wall_time']:.2f} s.", file=file)
+    for n, num in stats['distribution'].items():
+        print(f'    {n:2d} guesses: {num:5d}', file=file)
+    if stats['mean'] is not None:
+        print(f"    mean {stats['mean']:.4f}, worst {stats['worst']}",
+              file=file)
+    print(f"Move latency over {stats['moves']} moves:", end='', file=file)
+    for p, t in stats['move_latency'].items():
+        if t is not None:
+            print(f' {p} {t * 1e3:.3f} ms', end='', file=file)
+    print(file=file)
+    turns = stats['turns']
+    print(f"Pruning {turns['prune_time']:.2f} s "
+          f"({turns['prune_evaluations']} responses), "
+          f"scoring {turns['score_time']:.2f} s "
+          f"({turns['score_evaluations']} responses), guesses from",
+          ', '.join(f'{k} {n}' for k, n in turns['sources'].items()),
+          file=file)
+    if turns['truncated']:
+        print(f"{turns['truncated']} turns ran out of time.", file=file)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Solve every code and report statistics.')
+    parser.add_argument('-o', '--output', type=str, default=None,
+                        help='Write the results to this JSON file.')
+    mm.add_solver_arguments(parser)
+    parser.add_argument('-i', '--incremental', action='store_const',
+                        help='Narrow the responses across turns.',
+                        const=True, default=False)
+    parser.add_argument('-y', '--symmetry', action='store_const',
+                        help='Only score one guess per symmetry class.',
+                        const=True, default=False)
+    parser.add_argument('--time-budget', type=float, default=None,
+                        help='Seconds to score the guesses of each turn.')
+    parser.add_argument('--profile', type=str, default=None,
+                        help='Dump cProfile statistics to this file.')
+    args = parser.parse_args()
+
+    spec, kwargs = mm.solver_options(args)
+    kwargs.update(incremental=args.incremental, symmetry=args.symmetry,
+                  time_budget=args.time_budget)
+
+    with mm.profile(args.profile):
+        stats = benchmark(spec, **kwargs)
+    report(stats)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(stats, f, indent=1)
+
+
+if __name__ == '__main__':
+    main()
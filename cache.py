@@ -0,0 +1,93 @@
+"""
+Cache of the solver's next guesses.
+
+Many game histories leave the same candidate sets S and T, for which
+the minimax gives the same next guess. `GuessCache` memoizes those
+guesses, keyed by a digest of the board and of the S and T bitsets,
+with a bounded LRU eviction policy and optional persistence to a file:
+
+    python mastermind2.py --cache guesses.cache
+"""
+
+import os
+import struct
+import hashlib
+from collections import OrderedDict
+
+
+MAGIC = b'MMGC\x01'
+KEY_SIZE = 16
+ENTRY = struct.Struct(f'<{KEY_SIZE}sI')
+
+
+class GuessCache:
+    """LRU cache of next guesses, see `mastermind2.get_next_guess`.
+
+    At most `maxsize` guesses are kept, the least recently used ones
+    are evicted first. If `filename` is given and exists, the cache is
+    loaded from it, `save` writes it back.
+
+    `hits` and `misses` count the lookups, to help sizing the cache.
+    """
+
+    def __init__(self, maxsize=100_000, filename=None):
+        self.maxsize = maxsize
+        self.filename = filename
+        self.data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        if filename is not None and os.path.exists(filename):
+            self.load(filename)
+
+    def __len__(self):
+        return len(self.data)
+
+    def __repr__(self):
+        return (f'<GuessCache of {len(self)} guesses, '
+                f'{self.hits} hits, {self.misses} misses>')
+
+    @staticmethod
+    def key(S, T, *extra):
+        """Digest of the candidate sets `S` and `T`, `CodeSet` of the
+        same board, and of any `extra` solver settings."""
+        h = hashlib.blake2b(digest_size=KEY_SIZE)
+        h.update(repr((S.spec,) + extra).encode())
+        h.update(S._bytes())
+        h.update(T._bytes())
+        return h.digest()
+
+    def get(self, key):
+        """Cached guess for `key`, None if not in the cache."""
+        guess = self.data.get(key)
+        if guess is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.data.move_to_end(key)
+        return guess
+
+    def put(self, key, guess):
+        self.data[key] = guess
+        self.data.move_to_end(key)
+        while len(self.data) > self.maxsize:
+            self.data.popitem(last=False)
+
+    def load(self, filename):
+        with open(filename, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f'{filename}: not a guess cache file.')
+            buf = f.read()
+        for key, guess in ENTRY.iter_unpack(buf):
+            self.put(key, guess)
+
+    def save(self, filename=None):
+        """Write the cache, least recently used first. The file is
+        replaced atomically, so other processes never see a partial
+        file."""
+        filename = filename or self.filename
+        tmp = f'{filename}.{os.getpid()}.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(MAGIC)
+            for key, guess in self.data.items():
+                f.write(ENTRY.pack(key, guess))
+        os.replace(tmp, filename)
@@ -0,0 +1,276 @@
+"""
+Streaming log of Mastermind games, and tools to check and summarize it.
+
+Games are appended to a JSON Lines file as they are played, one record
+per line:
+
+    {"game": "3f2a...", "event": "start", "positions": 4, "colours": "rgbcym", "code": "ycmb"}
+    {"game": "3f2a...", "event": "move", "move": 1, "guess": "rrgg", "response": [0, 0]}
+    {"game": "3f2a...", "event": "end", "solved": true, "guesses": 5}
+
+The code is null when the computer breaks a code kept by a human, who
+can take back a move, logged as {"game": "3f2a...", "event": "undo"}.
+Records of games played at once, e.g. by the batch workers, may be
+interleaved, and a game interrupted has no end record. A log whose
+writer was killed may end with a truncated line, reported as invalid
+like any other record that cannot be read.
+
+    python mastermind2.py --log games.jsonl
+    python batch.py codes.txt --log games.jsonl
+    python gamelog.py validate games.jsonl
+    python gamelog.py stats games.jsonl
+    python gamelog.py replay games.jsonl --game 3f2a...
+
+The log files are read one line at a time, only the games in progress
+are kept in memory, so any number of games can be checked.
+"""
+
+import sys
+import json
+import uuid
+import argparse
+from collections import Counter
+
+import mastermind2 as mm
+
+
+class GameLog:
+    """Writer of a game log file, see the module docstring.
+
+    The file is opened for appending when the first record is written,
+    and every record is flushed, so the log is complete up to the last
+    move even if the program is killed. A `GameLog` can be sent to
+    other processes, each one then appends to the same file.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.file = None
+
+    def __getstate__(self):
+        return {'filename': self.filename, 'file': None}
+
+    def write(self, record):
+        if self.file is None:
+            self.file = open(self.filename, 'a', buffering=1)
+        self.file.write(json.dumps(record) + '\n')
+
+    def start(self, spec, code=None):
+        """Write the start record of a new game, return its id."""
+        game = uuid.uuid4().hex
+        self.write({'game': game, 'event': 'start',
+                    'positions': spec.positions, 'colours': spec.colours,
+                    'code': code})
+        return game
+
+    def move(self, game, move, guess, resp):
+        self.write({'game': game, 'event': 'move', 'move': move,
+                    'guess': guess, 'response': list(resp)})
+
+    def undo(self, game):
+        """The last move of the game is taken back."""
+        self.write({'game': game, 'event': 'undo'})
+
+    def end(self, game, solved, guesses):
+        self.write({'game': game, 'event': 'end', 'solved': solved,
+                    'guesses': guesses})
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+def read_records(filenames):
+    """Records of the log files, one at a time. '-' reads stdin. A line
+    that is not a record, e.g. truncated, is read as an 'invalid' event
+    giving its file and line number."""
+    for filename in filenames:
+        f = sys.stdin if filename == '-' else open(filename)
+        with f:
+            for n, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    record = None
+                if not isinstance(record, dict) or not (
+                        {'game', 'event'} <= record.keys()):
+                    record = {'game': None, 'event': 'invalid',
+                              'file': str(filename), 'line': n}
+                yield record
+
+
+def games(records):
+    """Group the records by game, yielding the (start, moves, end) of
+    each game when its end record is read, then the games with no end
+    record, with `end` None. Only the games in progress are kept.
+
+    The records of a game with no start record are grouped with
+    `start` None, and each invalid record is a game of its own, with
+    `start` None. An undo with no move to take back is kept in the
+    moves. `validate` reports all of these.
+    """
+    open_games = {}
+    for record in records:
+        game, event = record['game'], record['event']
+        if event == 'invalid':
+            yield None, [record], None
+            continue
+        if event == 'start':
+            open_games[game] = (record, [])
+            continue
+        start, moves = open_games.setdefault(game, (None, []))
+        if event == 'move':
+            moves.append(record)
+        elif event == 'undo':
+            if moves and moves[-1]['event'] == 'move':
+                moves.pop()
+            else:
+                moves.append(record)
+        else:
+            del open_games[game]
+            yield start, moves, record
+    for start, moves in open_games.values():
+        yield start, moves, None
+
+
+def validate(start, moves, end):
+    """Errors of a logged game, an empty list if it is consistent.
+
+    Responses are checked with `mastermind2.get_response` if the code is
+    known, otherwise some code must be consistent with all of them, as
+    found by `mastermind2.consistent_codes` without going through all
+    the codes of the board, which may be huge.
+    """
+    if start is None:
+        record = moves[0] if moves else end
+        if record['event'] == 'invalid':
+            return [f"line {record['line']} of {record['file']} "
+                    'is not a record']
+        return ['no start record']
+    spec = mm.GameSpec(start['positions'], start['colours'])
+    code = start['code']
+    errors = []
+    if code is not None and not spec.is_valid_guess(code):
+        return [f'invalid code {code!r}']
+    if any(record['event'] == 'undo' for record in moves):
+        errors.append('undo with no move to take back')
+        moves = [record for record in moves if record['event'] == 'move']
+    history = []
+    solved = False
+    for n, record in enumerate(moves, 1):
+        guess, resp = record['guess'], tuple(record['response'])
+        if record['move'] != n:
+            errors.append(f'move {record["move"]} is move {n}')
+        if solved:
+            errors.append(f'move {n} after the code was broken')
+        if not spec.is_valid_guess(guess):
+            errors.append(f'move {n}: invalid guess {guess!r}')
+            continue
+        if code is not None:
+            if mm.get_response(guess, code) != resp:
+                errors.append(f'move {n}: response {resp} to {guess}, '
+                              f'should be {mm.get_response(guess, code)}')
+        elif not spec.is_valid_response(resp):
+            errors.append(f'move {n}: invalid response {resp}')
+        elif not spec.is_solved(resp):
+            history.append((guess, resp))
+            if next(mm.consistent_codes(spec, history), None) is None:
+                errors.append(f'move {n}: no code gives these responses')
+        solved = solved or spec.is_solved(resp)
+    if end is not None:
+        if end['solved'] != solved:
+            errors.append(f'end record says solved={end["solved"]}')
+        if end['guesses'] != len(moves):
+            errors.append(f'end record says {end["guesses"]} guesses, '
+                          f'{len(moves)} were logged')
+    return errors
+
+
+def aggregate(records):
+    """Summary of the games of the `records`: number of games, solved,
+    unfinished, invalid, i.e. with no start record or not a record, the
+    distribution of guesses of the games solved, and their mean."""
+    counts = Counter()
+    unfinished = 0
+    invalid = 0
+    num_games = 0
+    for start, moves, end in games(records):
+        num_games += 1
+        if start is None:
+            invalid += 1
+        elif end is None:
+            unfinished += 1
+        elif end['solved']:
+            counts[len(moves)] += 1
+    solved = sum(counts.values())
+    return {
+        'games': num_games,
+        'solved': solved,
+        'unfinished': unfinished,
+        'invalid': invalid,
+        'distribution': dict(sorted(counts.items())),
+        'mean': sum(n * c for n, c in counts.items()) / solved
+                if solved else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Replay, validate and summarize game logs.')
+    parser.add_argument('command', choices=['replay', 'validate', 'stats'])
+    parser.add_argument('files', type=str, nargs='+',
+                        help="Game log files, '-' for stdin.")
+    parser.add_argument('--game', type=str, default=None,
+                        help='Only replay the game with this id.')
+    args = parser.parse_args()
+
+    records = read_records(args.files)
+    if args.command == 'stats':
+        stats = aggregate(records)
+        print(f"{stats['games']} games, {stats['solved']} solved, "
+              f"{stats['unfinished']} unfinished, "
+              f"{stats['invalid']} invalid.")
+        for n, num in stats['distribution'].items():
+            print(f'    {n:2d} guesses: {num:5d}')
+        if stats['mean'] is not None:
+            print(f"    mean {stats['mean']:.4f}")
+        return
+
+    invalid = 0
+    num_games = 0
+    for start, moves, end in games(records):
+        num_games += 1
+        if args.command == 'replay':
+            if start is None:
+                if args.game is None:
+                    print(f"Invalid: {'; '.join(validate(start, moves, end))}")
+                continue
+            if args.game is not None and start['game'] != args.game:
+                continue
+            print(f"Game {start['game']}, code {start['code']}:")
+            for record in moves:
+                if record['event'] == 'undo':
+                    print('Undo with no move to take back.')
+                    continue
+                blacks, whites = record['response']
+                print(f"[{record['move']}] guess='{record['guess']}' "
+                      f"-> {blacks=}, {whites=}")
+            if end is None:
+                print('Unfinished.')
+        else:
+            errors = validate(start, moves, end)
+            if errors:
+                invalid += 1
+                game = (start or (moves[0] if moves else end))['game']
+                where = 'Invalid' if game is None else f'Game {game}'
+                print(f"{where}: {'; '.join(errors)}")
+    if args.command == 'validate':
+        print(f'{num_games} games, {invalid} invalid.')
+        sys.exit(1 if invalid else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+"""
+Load test of the game server, see server.py.
+
+Plays many games at once against a running server, the server breaking
+random codes kept by the clients, and reports the games per second and
+the latency of the server's guesses:
+
+    python server.py -t &
+    python loadtest.py -n 1000 -c 100
+"""
+
+import time
+import random
+import asyncio
+import argparse
+
+import mastermind2 as mm
+from benchmark import percentile
+
+
+async def _play(host, port, codes, latencies, spec):
+    reader, writer = await asyncio.open_connection(host, port)
+
+    async def ask(line):
+        writer.write(line.encode() + b'\n')
+        await writer.drain()
+        answer = (await reader.readline()).decode().strip()
+        if not answer or answer.startswith('ERR'):
+            raise RuntimeError(f'{line!r}: {answer or "connection closed"}')
+        return answer
+
+    counts = []
+    try:
+        while codes:
+            code = codes.pop()
+            await ask('BREAK')
+            while True:
+                start = time.perf_counter()
+                guess = (await ask('NEXT')).split()[1]
+                latencies.append(time.perf_counter() - start)
+                blacks, whites = mm.get_response(guess, code)
+                answer = await ask(f'RESPONSE {blacks} {whites}')
+                if answer.startswith('SOLVED'):
+                    counts.append(int(answer.split()[1]))
+                    break
+        writer.write(b'QUIT\n')
+        await writer.drain()
+    finally:
+        writer.close()
+    return counts
+
+
+async def load_test(host='127.0.0.1', port=7777, games=100, concurrency=10,
+                    spec=mm.CLASSIC, seed=None):
+    """Play `games` random games over `concurrency` connections at once.
+    Returns a dict with the statistics."""
+    rng = random.Random(seed)
+    codes = [spec.random_code(rng) for _ in range(games)]
+    latencies = []
+    start = time.perf_counter()
+    results = await asyncio.gather(*[
+        _play(host, port, codes, latencies, spec)
+        for _ in range(concurrency)])
+    wall_time = time.perf_counter() - start
+
+    counts = [n for r in results for n in r]
+    latencies.sort()
+    return {
+        'games': len(counts),
+        'wall_time': wall_time,
+        'games_per_second': len(counts) / wall_time,
+        'mean': sum(counts) / len(counts) if counts else None,
+        'moves': len(latencies),
+        'move_latency': {
+            f'p{p}': percentile(latencies, p) for p in (50, 90, 99, 100)
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Load test of the Mastermind game server.')
+    parser.add_argument('--host', type=str, default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=7777)
+    parser.add_argument('-n', '--games', type=int, default=100,
+                        help='Number of games to play.')
+    parser.add_argument('-c', '--concurrency', type=int, default=10,
+                        help='Number of connections at once.')
+    parser.add_argument('--seed', type=int, default=None,
+                        help='Seed of the random codes.')
+    args = parser.parse_args()
+
+    stats = asyncio.run(load_test(args.host, args.port, args.games,
+                                  args.concurrency, seed=args.seed))
+    print(f"Played {stats['games']} games in {stats['wall_time']:.2f} s, "
+          f"{stats['games_per_second']:.1f} games/s, "
+          f"mean {stats['mean']:.4f} guesses.")
+    print(f"Move latency over {stats['moves']} moves:", end='')
+    for p, t in stats['move_latency'].items():
+        if t is not None:
+            print(f' {p} {t * 1e3:.3f} ms', end='')
+    print()
+
+
+if __name__ == '__main__':
+    main()
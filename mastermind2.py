@@ -21,15 +21,235 @@ https://en.wikipedia.org/wiki/Mastermind_(board_game)#Worst_case:_Five-guess_alg
 https://stackoverflow.com/questions/62430071/donald-knuth-algorithm-mastermind
 """
 
+import os
 import sys
+import math
+import mmap
+import struct
+import time
+import random
 import argparse
+import cProfile
+import functools
 import itertools
-from collections import defaultdict
+import contextlib
+from array import array
+from collections import Counter, namedtuple
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 
 PEGS = 'rgbcym'
 
 
+class GameSpec:
+    """Board dimensions of a game: `positions` pegs per code, each one
+    of the `colours`. Repeating colours is allowed.
+
+    Codes are indexed as base-k integers, k being the number of colours,
+    following the order of `itertools.product(colours, repeat=positions)`.
+    Responses (blacks, whites) are packed into a single small int.
+
+    On large boards, scoring every guess in T against every code in S
+    does not finish in reasonable time. `max_guesses` and `max_codes`
+    cap the number of guesses scored and of codes they are scored
+    against per turn, picking a random sample that keeps the original
+    order. `seed` makes the samples reproducible.
+    """
+
+    def __init__(self, positions=4, colours=PEGS,
+                 max_guesses=None, max_codes=None, seed=0):
+        self.positions = positions
+        self.colours = colours
+        self.max_guesses = max_guesses
+        self.max_codes = max_codes
+        self.seed = seed
+        self.num_codes = len(colours) ** positions
+        self.num_responses = (positions + 1) ** 2
+
+    def __repr__(self):
+        return (f'GameSpec({self.positions}, {self.colours!r}, '
+                f'max_guesses={self.max_guesses}, '
+                f'max_codes={self.max_codes}, seed={self.seed})')
+
+    def __eq__(self, other):
+        # By the board fields, not the class: run as a script, this
+        # module is imported again as mastermind2, e.g. by
+        # strategy_tree.py, with a GameSpec class of its own.
+        return (type(other).__name__ == 'GameSpec' and
+                repr(self) == repr(other))
+
+    def __hash__(self):
+        return hash(repr(self))
+
+    def codes(self):
+        """Iterate over all codes, as tuples."""
+        return itertools.product(self.colours, repeat=self.positions)
+
+    def default_guess(self):
+        """Knuth's first guess, 'rrgg' for the classic game."""
+        half = self.positions // 2
+        return (self.colours[0] * half +
+                self.colours[1] * (self.positions - half))
+
+    def random_code(self, rng=random):
+        return ''.join(rng.choice(self.colours)
+                       for _ in range(self.positions))
+
+    def encode(self, code):
+        """Integer index of a code."""
+        n = 0
+        for peg in code:
+            n = n * len(self.colours) + self.colours.index(peg)
+        return n
+
+    def decode(self, n):
+        """Inverse of `encode`, returns the code as a string."""
+        code = []
+        for _ in range(self.positions):
+            n, i = divmod(n, len(self.colours))
+            code.append(self.colours[i])
+        return ''.join(reversed(code))
+
+    def pack_response(self, resp):
+        """Pack a (blacks, whites) response into a single small int."""
+        blacks, whites = resp
+        return blacks * (self.positions + 1) + whites
+
+    def unpack_response(self, r):
+        """Inverse of `pack_response`."""
+        return divmod(r, self.positions + 1)
+
+    def is_valid_guess(self, guess):
+        return (len(guess) == self.positions and
+                set(guess).issubset(set(self.colours)))
+
+    def is_valid_response(self, resp):
+        blacks, whites = resp
+        return (0 <= blacks <= self.positions and
+                0 <= whites <= self.positions and
+                whites + blacks <= self.positions and
+                not (blacks == self.positions - 1 and whites == 1))
+
+    def is_solved(self, resp):
+        return resp[0] == self.positions
+
+    def sample(self, seq, size):
+        """At most `size` elements of `seq`, in their original order."""
+        if size is None or len(seq) <= size:
+            return seq
+        keep = sorted(random.Random(self.seed).sample(range(len(seq)), size))
+        return [seq[i] for i in keep]
+
+
+# The classic game, 6 colours and 4 pegs, 1296 codes.
+CLASSIC = GameSpec()
+
+# Super Mastermind, 8 colours and 5 pegs, 32768 codes. Guesses and
+# codes scored are capped to keep each turn in the order of a second.
+SUPER = GameSpec(5, PEGS + 'wp', max_guesses=200, max_codes=2000)
+
+# Positions of the set bits of each byte value, see `CodeSet.indices`.
+_BYTE_BITS = [tuple(b for b in range(8) if v >> b & 1) for v in range(256)]
+
+
+class CodeSet:
+    """A set of codes, stored as a bitset over their `GameSpec.encode`
+    index. All 1296 codes of the classic game fit in 162 bytes.
+
+    Membership, removal and size are cheap integer operations. Iterating
+    yields the code indices in increasing order, i.e. the order of
+    `GameSpec.codes`.
+    """
+
+    __slots__ = ('spec', 'bits')
+
+    def __init__(self, spec=CLASSIC, bits=None):
+        self.spec = spec
+        if bits is None:
+            bits = (1 << spec.num_codes) - 1
+        self.bits = bits
+
+    @classmethod
+    def from_indices(cls, indices, spec=CLASSIC):
+        buf = bytearray((spec.num_codes + 7) // 8)
+        for i in indices:
+            buf[i >> 3] |= 1 << (i & 7)
+        return cls(spec, int.from_bytes(buf, 'little'))
+
+    @classmethod
+    def from_mask(cls, mask, spec=CLASSIC):
+        """From a NumPy boolean array of length `spec.num_codes`."""
+        buf = np.packbits(mask, bitorder='little').tobytes()
+        return cls(spec, int.from_bytes(buf, 'little'))
+
+    def mask(self):
+        """As a NumPy boolean array of length `spec.num_codes`."""
+        buf = np.frombuffer(self._bytes(), dtype=np.uint8)
+        bits = np.unpackbits(buf, bitorder='little')
+        return bits[:self.spec.num_codes].astype(bool)
+
+    def _bytes(self):
+        return self.bits.to_bytes((self.spec.num_codes + 7) // 8, 'little')
+
+    def indices(self):
+        """List of the code indices in the set, in increasing order."""
+        out = []
+        for byte_index, byte in enumerate(self._bytes()):
+            if byte:
+                base = byte_index << 3
+                out.extend(base + b for b in _BYTE_BITS[byte])
+        return out
+
+    def __iter__(self):
+        return iter(self.indices())
+
+    def __len__(self):
+        return bin(self.bits).count('1')
+
+    def __contains__(self, i):
+        return self.bits >> i & 1 == 1
+
+    def __eq__(self, other):
+        return (isinstance(other, CodeSet) and
+                self.spec == other.spec and self.bits == other.bits)
+
+    def __repr__(self):
+        return f'<CodeSet of {len(self)} codes>'
+
+    def discard(self, i):
+        self.bits &= ~(1 << i)
+
+    def copy(self):
+        return CodeSet(self.spec, self.bits)
+
+
+# Outcome of a game: the guesses played, as strings, the responses
+# received, and the seconds the computer took to find each guess after
+# the first one.
+GameResult = namedtuple('GameResult', 'guesses responses move_times')
+
+# State of a `GameSession`, see `GameSession.snapshot`. `undo_stack` is
+# the bits of S and T before each move pruned, for `GameSession.undo`.
+SessionState = namedtuple('SessionState',
+                          'S T pruned guesses responses pending undo_stack',
+                          defaults=((),))
+
+# Instrumentation of a turn of the solver, see `GameSession.next_guess`.
+# S and T are the sizes of the candidate sets once pruned, `removed` the
+# number of codes pruned from S. Evaluations are responses computed or
+# looked up. `source` is where the guess comes from: 'first', 'tree',
+# 'cache' or 'solver'. `evaluated` is the fraction of the guesses
+# scored, less than 1 if the time budget ran out.
+TurnStats = namedtuple('TurnStats',
+                       'turn S T removed prune_time score_time '
+                       'prune_evaluations score_evaluations source '
+                       'evaluated')
+
+
 def get_response(guess, code):
     """Return the number of black and white pegs for a guess and a code.
 
@@ -76,154 +296,1404 @@ def get_response(guess, code):
     return blacks, whites
 
 
-def get_response_iteractive():
+@functools.lru_cache(maxsize=4)
+def _code_counts(spec):
+    """Colour indices and colour counts of all codes, as tuples, or as
+    NumPy arrays if available, see `get_responses`."""
+    k = len(spec.colours)
+    digits = list(zip(*_digit_columns(spec)))
+    counts = [tuple(d.count(c) for c in range(k)) for d in digits]
+    if np is None:
+        return digits, counts
+    return np.array(digits, dtype=np.int8), np.array(counts, dtype=np.int8)
+
+
+def get_responses(guess, codes, spec=CLASSIC):
+    """Packed responses of the code index `guess` to each of the code
+    indices `codes`, see `GameSpec.pack_response`.
+
+    The colours in the right positions are the blacks, and those in
+    common, the sum over the colours of the smaller of their counts in
+    the guess and the code, are the blacks plus the whites. Computed in
+    bulk with NumPy if available, in pure Python otherwise. Returns a
+    list of ints, same as `get_response` on the decoded codes.
+    """
+    n = spec.positions
+    digits, counts = _code_counts(spec)
+    if np is not None:
+        codes = np.asarray(codes, dtype=np.intp)
+        blacks = (digits[codes] == digits[guess]).sum(axis=1)
+        total = np.minimum(counts[codes], counts[guess]).sum(axis=1)
+        # pack_response(b, w) == n * b + (b + w)
+        return (n * blacks + total).tolist()
+
+    g_digits = digits[guess]
+    # only the colours of the guess can be in common
+    g_counts = [(c, m) for c, m in enumerate(counts[guess]) if m]
+    responses = []
+    for code in codes:
+        blacks = sum(map(int.__eq__, g_digits, digits[code]))
+        c_counts = counts[code]
+        total = 0
+        for c, m in g_counts:
+            total += min(m, c_counts[c])
+        responses.append(n * blacks + total)
+    return responses
+
+
+class ResponseTable:
+    """Precomputed responses for every pair of codes.
+
+    Codes are indexed as in `GameSpec.encode`. The packed response of
+    guess `i` against code `j` is stored in `data[i * n + j]`, one byte
+    per pair, i.e. 1296 x 1296 bytes for the classic game. This grows
+    with the square of the number of codes: Super Mastermind would
+    need 1 GiB, use a capped `GameSpec` there instead.
+
+    A table can be saved to a file and memory-mapped back with `load`,
+    which is near-instant, and shares one copy of the responses between
+    all the processes using the file.
+
+    `get_response` remains the reference implementation, see `verify`.
+    """
+
+    # File format: a header, see `_header`, then the responses
+    MAGIC = b'MMRT'
+    VERSION = 1
+
+    def __init__(self, spec=CLASSIC):
+        self.spec = spec
+        self.size = spec.num_codes
+        self.data = self._build()
+        # file the data is mapped from, see `load`
+        self.filename = None
+
+    def __getstate__(self):
+        # A mapped table is sent to other processes by file name, each
+        # one maps the same pages
+        if self.filename is None:
+            return self.__dict__
+        return {'spec': self.spec, 'filename': self.filename}
+
+    def __setstate__(self, state):
+        if 'data' not in state:
+            state = self.load(state['filename'], state['spec']).__dict__
+        self.__dict__.update(state)
+
+    @classmethod
+    def _header(cls, spec):
+        # Format version, board and list of codes in index order, so
+        # that a file of another board or encoding is detected
+        colours = spec.colours.encode()
+        return (struct.pack('<4sHHHI', cls.MAGIC, cls.VERSION,
+                            spec.positions, len(colours), spec.num_codes)
+                + colours + ''.join(map(''.join, spec.codes())).encode())
+
+    def save(self, filename):
+        """Write the table to `filename`, to be read with `load`. The
+        file is replaced at once, so readers never see it half written.
+        """
+        tmp = f'{filename}.{os.getpid()}.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(self._header(self.spec))
+            f.write(self.data)
+        os.replace(tmp, filename)
+
+    @classmethod
+    def load(cls, filename, spec=CLASSIC):
+        """Table of `spec` memory-mapped from `filename`, read-only. If
+        the file is missing, or is not a table of this board and
+        version, the table is built and saved to it first."""
+        try:
+            return cls._map(filename, spec)
+        except (OSError, ValueError):
+            cls(spec).save(filename)
+            return cls._map(filename, spec)
+
+    @classmethod
+    def _map(cls, filename, spec):
+        header = cls._header(spec)
+        with open(filename, 'rb') as f:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if (len(data) != len(header) + spec.num_codes ** 2 or
+                data[:len(header)] != header):
+            data.close()
+            raise ValueError(f'{filename} is not a response table of '
+                             'this board and version.')
+        table = object.__new__(cls)
+        table.spec = spec
+        table.size = spec.num_codes
+        table.data = memoryview(data)[len(header):]
+        table.filename = filename
+        return table
+
+    def _build(self):
+        # pack_response(b, w) == n * b + (b + w), where n is the number
+        # of positions, b + w only depends
+        # on the multiset of colours of each code and b is the sum over
+        # positions of matching colours. A row is computed at once by
+        # adding those terms as big integers with one byte per code.
+        n = self.size
+        codes = list(self.spec.codes())
+        multisets = {}
+        ms_index = [
+            multisets.setdefault(tuple(sorted(c)), len(multisets))
+            for c in codes
+        ]
+        ms_counts = [Counter(m) for m in multisets]
+        totals = [
+            bytes(sum(min(a[p], b[p]) for p in a) for b in ms_counts)
+            for a in ms_counts
+        ]
+        lanes = {
+            (pos, peg): int.from_bytes(
+                bytes(c[pos] == peg for c in codes), 'little')
+            for pos in range(self.spec.positions)
+            for peg in self.spec.colours
+        }
+        data = array('B')
+        for g, m in zip(codes, ms_index):
+            row = int.from_bytes(
+                bytes(map(totals[m].__getitem__, ms_index)), 'little')
+            row += self.spec.positions * sum(
+                lanes[pos, peg] for pos, peg in enumerate(g))
+            data.frombytes(row.to_bytes(n, 'little'))
+        return data
+
+    def row(self, guess):
+        """Packed responses of guess index `guess` against every code."""
+        return memoryview(self.data)[guess * self.size:(guess + 1) * self.size]
+
+    def lookup(self, guess, code):
+        """Packed response of guess index `guess` against code index
+        `code`, same as `get_response` on the decoded codes."""
+        return self.data[guess * self.size + code]
+
+    def verify(self):
+        """Check every entry against `get_response`."""
+        codes = list(self.spec.codes())
+        for i, g in enumerate(codes):
+            row = self.data[i * self.size:(i + 1) * self.size]
+            for r, c in zip(row, codes):
+                if r != self.spec.pack_response(get_response(g, c)):
+                    return False
+        return True
+
+
+def partition_histograms(guesses, codes, table=None, chunk=256, spec=CLASSIC,
+                         progress=None):
+    """Count, for each guess, how many codes give each response.
+
+    `guesses` and `codes` are integer arrays as given by `spec.encode`.
+    Returns an array of shape (len(guesses), spec.num_responses) where
+    column `r` is
+    the number of codes with packed response `r`. Responses are looked
+    up in `table` if given, otherwise computed in bulk from the digits
+    and colour counts of the codes. Guesses are processed in chunks to
+    bound memory usage. After each chunk, `progress(done, total)` is
+    called if given.
+
+    Requires NumPy.
+    """
+    guesses = np.asarray(guesses, dtype=np.intp)
+    codes = np.asarray(codes, dtype=np.intp)
+    hist = np.empty((len(guesses), spec.num_responses), dtype=np.int64)
+    responses = _response_matrix(codes, table, spec)
+    for start in range(0, len(guesses), chunk):
+        g = guesses[start:start + chunk]
+        hist[start:start + len(g)] = _row_histograms(responses(g), spec)
+        if progress is not None:
+            progress(start + len(g), len(guesses))
+    return hist
+
+
+def _response_matrix(codes, table=None, spec=CLASSIC):
+    """Function of an integer array of guesses to the array of the
+    packed responses of the `codes` to each of them, one row per guess.
+    Looked up in `table` if given, otherwise computed in bulk from the
+    digits and colour counts of the codes."""
+    if table is not None:
+        matrix = np.frombuffer(table.data, dtype=np.uint8).reshape(
+            table.size, table.size)
+        return lambda g: matrix[np.ix_(g, codes)]
+
+    n, k = spec.positions, len(spec.colours)
+    powers = k ** np.arange(n - 1, -1, -1)
+    def digits(a):
+        return (a[:, None] // powers) % k
+    def counts(d):
+        return (d[:, :, None] == np.arange(k)).sum(axis=1)
+    code_digits = digits(codes)
+    code_counts = counts(code_digits)
+
+    def responses(g):
+        g_digits = digits(g)
+        blacks = (g_digits[:, None, :] == code_digits[None, :, :]).sum(-1)
+        total = np.minimum(counts(g_digits)[:, None, :],
+                           code_counts[None, :, :]).sum(-1)
+        # pack_response(b, w) == n * b + (b + w)
+        return (n * blacks + total).astype(np.uint8)
+    return responses
+
+
+def _row_histograms(responses, spec=CLASSIC):
+    """Count of each packed response in each row of `responses`."""
+    nr = spec.num_responses
+    rows = len(responses)
+    offsets = responses + nr * np.arange(rows)[:, None]
+    return np.bincount(offsets.ravel(),
+                       minlength=nr * rows).reshape(rows, nr)
+
+
+class Partitions:
+    """Responses of the unused codes in T, the guesses, to the codes in
+    S, kept across the turns of a game.
+
+    Between turns, S and T only lose codes. Rather than evaluating the
+    responses again, `update` narrows the kept ones: it drops the rows
+    of the guesses no longer in T and the columns of the codes no
+    longer in S, then counts the partition of each guess. Turns after
+    the first evaluate no response, but still copy and count |T| x |S|
+    of them: every unused code is a guess, so a turn cannot cost only
+    |S|, and the gain over scoring again is a constant factor. The
+    responses take |T| x |S| bytes.
+
+    Requires NumPy.
+    """
+
+    def __init__(self, spec=CLASSIC, table=None):
+        if np is None:
+            raise ImportError('Partitions require NumPy.')
+        self.spec = spec
+        self.table = table
+        self.guesses = None
+        self.guesses_set = None
+        self.codes = None
+        self.codes_set = None
+        self.responses = None
+        self.hist = None
+        # responses evaluated by the last update
+        self.evaluations = 0
+
+    def update(self, T, S):
+        """Histograms of the guesses in T over the codes in S, one row
+        per guess in `self.guesses`."""
+        if (self.guesses is None or
+                T.bits & ~self.guesses_set.bits or
+                S.bits & ~self.codes_set.bits):
+            # First turn, or sets not narrowed from the previous ones
+            self.guesses = np.array(T.indices(), dtype=np.intp)
+            self.codes = np.array(S.indices(), dtype=np.intp)
+            self.responses = _response_matrix(
+                self.codes, self.table, self.spec)(self.guesses)
+            self.evaluations = self.responses.size
+        else:
+            keep_guesses = T.mask()[self.guesses]
+            keep_codes = S.mask()[self.codes]
+            self.guesses = self.guesses[keep_guesses]
+            self.codes = self.codes[keep_codes]
+            self.responses = self.responses[np.ix_(keep_guesses,
+                                                   keep_codes)]
+            self.evaluations = 0
+        self.guesses_set = T.copy()
+        self.codes_set = S.copy()
+        self.hist = _row_histograms(self.responses, self.spec)
+        return self.hist
+
+
+def get_response_iteractive(spec=CLASSIC, session=None):
     """In an interactive game, the code keeper gives the reponse
     manually for each guess.
+
+    If the `GameSession` is given, the response must be consistent with
+    the previous ones, and 'u' returns None to undo the last move.
     """
     while True:
-        blacks = int(input('    How many blacks? '))
+        blacks = input('    How many blacks? ')
+        if session is not None and blacks.strip() == 'u':
+            return None
+        blacks = int(blacks)
         
-        if blacks == 4:
-            return 4, 0
+        if blacks == spec.positions:
+            return blacks, 0
 
         whites = int(input('    How many whites? '))
-        if (0 <= blacks <= 4 and
-            0 <= whites <= 4 and
-            whites + blacks <= 4 and
-            not (blacks == 3 and whites == 1)
-        ):
-            return blacks, whites
-        else:
+        if not spec.is_valid_response((blacks, whites)):
             print('Invalid input. Again...')
+        elif session is not None and not session.is_consistent(
+                (blacks, whites)):
+            print('    This response contradicts the previous ones.')
+            if not session.lazy:
+                print('    Possible blacks/whites:',
+                      ', '.join(f'{b}/{w}' for b, w in
+                                session.possible_responses()))
+            print("    Again, or 'u' to undo the last response...")
+        else:
+            return blacks, whites
 
 
-def prune(S, T, guess, resp, verbose):
+def prune(S, T, guess, resp, verbose, table=None):
+        # S and T are `CodeSet`, guess is a code index.
+        spec = S.spec
+
         # Remove current guess
-        S.remove(tuple(guess))
-        T.remove(tuple(guess))
+        S.discard(guess)
+        T.discard(guess)
 
         # 5. Remove from S any code that would not give the same
         # response of colored and white pegs.
-        S[:] = [c for c in S if get_response(guess, c) == resp]
+        r = spec.pack_response(resp)
+        if table is None:
+            codes = S.indices()
+            responses = get_responses(guess, codes, spec)
+            keep = [c for c, rc in zip(codes, responses) if rc == r]
+        else:
+            row = table.row(guess)
+            keep = [c for c in S if row[c] == r]
+        S.bits = CodeSet.from_indices(keep, spec).bits
 
         if verbose:
             print(f'    S has {len(S)} elements.')
 
 
-def get_next_guess(S, T, verbose):
-    # 6. Apply minimax technique to find a next guess
+def consistent_codes(spec, history, rng=None):
+    """Codes consistent with the `history`, a list of (guess, (blacks,
+    whites)), generated one at a time without going through all the
+    codes of the board.
+
+    The codes are built one peg at a time, backtracking as soon as the
+    pegs placed give too many blacks, or too many colours in common
+    with a guess, or leave too few positions to reach them. Codes come
+    in the order of `GameSpec.codes`, or with the colours of each
+    position tried in a random order if a `random.Random` is given.
+    """
+    n, k = spec.positions, len(spec.colours)
+    guesses = [[spec.colours.index(c) for c in g] for g, _ in history]
+    guess_counts = [[g.count(c) for c in range(k)] for g in guesses]
+    blacks = [b for _, (b, w) in history]
+    # colours in common, blacks plus whites
+    totals = [b + w for _, (b, w) in history]
+    moves = range(len(history))
+    code = [0] * n
+    counts = [0] * k
+    code_blacks = [0] * len(history)
+    code_totals = [0] * len(history)
+
+    def search(i):
+        if i == n:
+            yield ''.join(spec.colours[c] for c in code)
+            return
+        # pegs left after this one, each adds at most one black and one
+        # colour in common
+        left = n - i - 1
+        for c in range(k) if rng is None else rng.sample(range(k), k):
+            for j in moves:
+                b = code_blacks[j] + (guesses[j][i] == c)
+                t = code_totals[j] + (counts[c] < guess_counts[j][c])
+                if not (b <= blacks[j] <= b + left and
+                        t <= totals[j] <= t + left):
+                    break
+            else:
+                for j in moves:
+                    code_blacks[j] += guesses[j][i] == c
+                    code_totals[j] += counts[c] < guess_counts[j][c]
+                code[i] = c
+                counts[c] += 1
+                yield from search(i + 1)
+                counts[c] -= 1
+                for j in moves:
+                    code_totals[j] -= counts[c] < guess_counts[j][c]
+                    code_blacks[j] -= guesses[j][i] == c
+
+    return search(0)
+
+
+@functools.lru_cache(maxsize=4)
+def _digit_columns(spec):
+    """Colour indices of all codes, one tuple per position."""
+    k = len(spec.colours)
+    return tuple(tuple(c // k ** (spec.positions - 1 - i) % k
+                       for c in range(spec.num_codes))
+                 for i in range(spec.positions))
+
+
+def _compose(a, b):
+    """Symmetry `a` after `b`, both (positions, colours) permutations."""
+    return (tuple(a[0][i] for i in b[0]), tuple(a[1][i] for i in b[1]))
+
+
+def symmetries(S, T):
+    """Generators of the permutations of colours and positions that
+    leave the guesses played, the codes not in T, unchanged, and map S
+    onto itself. Each one is given as the list of the images of all
+    code indices.
+
+    A symmetry (p, q) moves the colour c at position i to the colour
+    q[c] at position p[i]. It leaves a guess g unchanged if q[g[i]] is
+    g[p[i]] at every position. For each permutation of the positions,
+    this fixes q on the colours played, and the colours not played can
+    be permuted freely.
+    """
+    spec = S.spec
+    n, k = spec.positions, len(spec.colours)
+    columns = _digit_columns(spec)
+    played = CodeSet(spec, ((1 << spec.num_codes) - 1) & ~T.bits).indices()
+    played = [[col[g] for col in columns] for g in played]
+    used = sorted({c for g in played for c in g})
+
+    # Symmetries of the colours played and the positions, as a group
+    identity = (tuple(range(n)), tuple(range(k)))
+    group = {identity}
+    generators = []
+    for p in itertools.permutations(range(n)):
+        q = list(range(k))
+        image = {}
+        for g in played:
+            for i in range(n):
+                if image.setdefault(g[i], g[p[i]]) != g[p[i]]:
+                    break
+            else:
+                continue
+            break
+        else:
+            if len(set(image.values())) < len(image):
+                continue
+            for c, d in image.items():
+                q[c] = d
+            s = (p, tuple(q))
+            if s in group:
+                continue
+            generators.append(s)
+            # closure of the group with the new generator
+            frontier = list(group)
+            while frontier:
+                x = frontier.pop()
+                for y in generators:
+                    z = _compose(y, x)
+                    if z not in group:
+                        group.add(z)
+                        frontier.append(z)
+    # Swaps of two colours not played
+    free = [c for c in range(k) if c not in used]
+    for a, b in zip(free, free[1:]):
+        q = list(range(k))
+        q[a], q[b] = b, a
+        generators.append((identity[0], tuple(q)))
+
+    images = []
+    for p, q in generators:
+        parts = [[q[c] * k ** (n - 1 - p[i]) for c in range(k)]
+                 for i in range(n)]
+        image = list(map(sum, zip(*(map(parts[i].__getitem__, columns[i])
+                                    for i in range(n)))))
+        if all(image[c] in S for c in S):
+            images.append(image)
+    return images
+
+
+def orbit_representatives(codes, generators, spec=CLASSIC):
+    """The codes of `codes` that are the smallest of their orbit under
+    the symmetries `generators`, as given by `symmetries`. The orbits
+    are found by union-find over the generators."""
+    if not generators:
+        return list(codes)
+    parent = list(range(spec.num_codes))
+
+    def find(x):
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    for image in generators:
+        for c, d in enumerate(image):
+            a, b = find(c), find(d)
+            if a < b:
+                parent[b] = a
+            elif b < a:
+                parent[a] = b
+    return [c for c in codes if find(c) == c]
+
+
+class Strategy:
+    """How the solver scores a guess, from the partition it makes of
+    the codes still possible, S. Lower scores are better.
+
+    `score` takes the sizes of the non-empty parts of one guess. The
+    NumPy backends call `scores` instead, with the partition histograms
+    of many guesses, one row per guess, see `partition_histograms`.
+    Subclasses define both, giving the same ranking.
+    """
+
+    name = None
+
+    def score(self, sizes):
+        raise NotImplementedError
+
+    def scores(self, hist):
+        return np.array([self.score(row[row > 0].tolist()) for row in hist])
+
+
+class Minimax(Strategy):
+    """Knuth: minimize the size of the largest part."""
+
+    name = 'minimax'
 
-    # Keep track of the worst score per guess
-    # Higher score is worse, therefore `max(scores)`
-    guesses_worst_score = dict()
-    for g in S:
-        scores = defaultdict(int)
-        for c in T:
-            r = get_response(g, c)
-            scores[r] += 1
-        worst_score = max(scores.values())  
-        guesses_worst_score[g] = worst_score
+    def score(self, sizes):
+        return max(sizes)
 
-    # Minimax: best of the worst score: min(max(scores))
-    best_score = min(guesses_worst_score.values())
+    def scores(self, hist):
+        return hist.max(axis=1)
+
+
+class ExpectedSize(Strategy):
+    """Minimize the expected size of the part of the code. Every guess
+    splits the same codes, so the sum of the squared part sizes gives
+    the same ranking, in integers."""
+
+    name = 'expected'
+
+    def score(self, sizes):
+        return sum(s * s for s in sizes)
+
+    def scores(self, hist):
+        return (hist * hist).sum(axis=1)
+
+
+class Entropy(Strategy):
+    """Maximize the entropy of the partition, i.e. minimize the sum of
+    s * log2(s) over the part sizes. Rounded so that the Python and
+    NumPy backends rank the same."""
+
+    name = 'entropy'
+
+    def score(self, sizes):
+        return round(sum(s * math.log2(s) for s in sizes), 9)
+
+    def scores(self, hist):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            terms = np.where(hist > 0, hist * np.log2(hist), 0.0)
+        return terms.sum(axis=1).round(9)
+
+
+class MostParts(Strategy):
+    """Kooi: maximize the number of parts."""
+
+    name = 'parts'
+
+    def score(self, sizes):
+        return -len(sizes)
+
+    def scores(self, hist):
+        return -(hist > 0).sum(axis=1)
+
+
+STRATEGIES = {s.name: s for s in (Minimax(), ExpectedSize(), Entropy(),
+                                  MostParts())}
+
+
+def get_next_guess(S, T, verbose, table=None, backend='python', cache=None,
+                   partitions=None, strategy='minimax', progress=None,
+                   stats=None, symmetry=False, time_budget=None,
+                   executor=None):
+    """Index of the next guess for the candidate sets S and T, both
+    `CodeSet`. If a `cache.GuessCache` is given, the scoring only runs
+    for candidate sets not seen before. If `Partitions` are given, the
+    responses are narrowed from the previous turn rather than evaluated.
+
+    `strategy` is a `Strategy`, or the name of one in `STRATEGIES`.
+
+    If given, `progress(done, total)` is called every now and then with
+    the number of guesses scored so far. Exceptions raised by it are
+    propagated, which can be used to cancel a long computation.
+
+    If a dict `stats` is given, its 'source' is set to 'cache' or
+    'solver', its 'score_evaluations' to the number of responses
+    evaluated, and its 'evaluated' to the fraction of the guesses
+    scored, see `TurnStats`.
+
+    With `symmetry`, only one guess per class of guesses equivalent up
+    to the `symmetries` of S and T is scored, the smallest, which gives
+    the same next guess. Not used with `partitions` or on sampled
+    boards.
+
+    With a `time_budget` in seconds, the guesses of S are scored first,
+    then the others, and the best guess scored when the time is up is
+    returned, at least one guess being scored. Such a guess is not
+    cached unless all the guesses were scored. Not used with
+    `partitions`.
+
+    With a `concurrent.futures.Executor`, the guesses are split in
+    shards scored in parallel, giving the same guess. Threads run the
+    numpy backend in parallel, processes are needed otherwise. The
+    table is sent with each shard, a memory-mapped one by file name
+    only, see `ResponseTable.load`.
+    """
+    if isinstance(strategy, str):
+        strategy = STRATEGIES[strategy]
+    if stats is None and time_budget is not None:
+        stats = {}
+
+    if cache is not None:
+        key = cache.key(S, T, strategy.name)
+        guess = cache.get(key)
+        if guess is not None:
+            if verbose:
+                print(f'    cached guess "{S.spec.decode(guess)}"')
+            if stats is not None:
+                stats['source'] = 'cache'
+            return guess
+
+    guess = _best_guess(S, T, verbose, table, backend, partitions, strategy,
+                        progress, stats, symmetry, time_budget, executor)
+
+    if (cache is not None and guess is not None and
+            (stats is None or stats.get('evaluated', 1.0) == 1.0)):
+        cache.put(key, guess)
+    return guess
+
+
+def _best_guess(S, T, verbose, table, backend, partitions, strategy,
+                progress, stats=None, symmetry=False, time_budget=None,
+                executor=None):
+    # 6. For each possible guess, any unused code in T, count how many
+    # codes of S give each response, and score the guess from those
+    # counts. Minimax technique by default: min(max(counts)).
+    spec = S.spec
+    deadline = None
+    if time_budget is not None:
+        deadline = time.perf_counter() + time_budget
+    sampled = spec.max_guesses is not None or spec.max_codes is not None
+    if stats is not None:
+        stats['source'] = 'solver'
+
+    # With at most 2 codes left, guessing one of them is the best.
+    if len(S) <= 2:
+        return next(iter(S), None)
+
+    # On large boards, only score a sample of the guesses against a
+    # sample of the codes, see `GameSpec`.
+    if partitions is None or sampled:
+        guesses = spec.sample(T.indices(), spec.max_guesses)
+        codes = spec.sample(S.indices(), spec.max_codes)
+        # Equivalent guesses have the same score and are all in S or
+        # not, the first of the best guesses is then a representative.
+        if symmetry and not sampled:
+            guesses = orbit_representatives(guesses, symmetries(S, T), spec)
+        # Against the clock, the guesses that might break the code first
+        if deadline is not None:
+            guesses = ([g for g in guesses if g in S] +
+                       [g for g in guesses if g not in S])
+
+    # Keep track of the score per guess, lower is better
+    guesses_score = dict()
+    if partitions is not None and not sampled:
+        hist = partitions.update(T, S)
+        guesses_score = dict(zip(partitions.guesses.tolist(),
+                                 strategy.scores(hist).tolist()))
+        if stats is not None:
+            stats['score_evaluations'] = partitions.evaluations
+            stats['evaluated'] = 1.0
+    else:
+        score = _score_guesses if executor is None else functools.partial(
+            _score_shards, executor)
+        guesses_score = dict(zip(guesses, score(
+            guesses, codes, table, backend, strategy, spec, progress,
+            deadline)))
+        if stats is not None:
+            stats['score_evaluations'] = len(guesses_score) * len(codes)
+            stats['evaluated'] = len(guesses_score) / len(guesses)
+        if verbose and len(guesses_score) < len(guesses):
+            print(f'    time is up, scored {len(guesses_score)} of '
+                  f'{len(guesses)} guesses')
+
+    # Best of the scores, e.g. for minimax min(max(scores))
+    best_score = min(guesses_score.values())
 
     if verbose:
         num_best_score = list(
-            guesses_worst_score.values()
+            guesses_score.values()
             ).count(best_score)
-        print(f'    best worst score is {best_score}, '
+        print(f'    best {strategy.name} score is {best_score}, '
               f'for {num_best_score} guesses: ',
              end='')
-        for tmp_guess, tmp_score in guesses_worst_score.items():
-            if tmp_score == best_score:
-                print(f'"{"".join(tmp_guess)}"', end=' ')
-        print()
+        best_guesses = [g for g, s in guesses_score.items() if s == best_score]
+        for tmp_guess in best_guesses[:10]:
+            print(f'"{spec.decode(tmp_guess)}"', end=' ')
+        print('...' if len(best_guesses) > 10 else '')
 
     # Guesses with best_score are not necessarily unique.
-    # Picks the first guess with `best_score`
-    #guess = ''.join(
-    #    list(guesses_worst_score.keys()
-    #        )[list(guesses_worst_score.values()).index(best_score)])
+    # Picks the first guess with `best_score`, preferring codes of S,
+    # which might be the secret code, as in Knuth's algorithm.
     next_guesses = []
-    for tentative_guess, score in guesses_worst_score.items():
+    for tentative_guess, score in guesses_score.items():
         if score == best_score:
             next_guesses.append(tentative_guess)
 
     for next_guess in next_guesses:
-        if next_guess in T:
-            guess = ''.join(next_guess)
-            return guess
+        if next_guess in S:
+            return next_guess
 
     for next_guess in next_guesses:
-        if next_guess in S:
-            guess = ''.join(next_guess)
-            return guess
+        if next_guess in T:
+            return next_guess
 
     return None
 
 
-def get_next_guess_iteractive():
+def _score_guesses(guesses, codes, table, backend, strategy, spec=CLASSIC,
+                   progress=None, deadline=None):
+    """Scores of the `guesses`, in order, by the `strategy`, from the
+    responses of the `codes`. If the `deadline`, a `time.perf_counter`
+    time, passes, the scores of the guesses scored so far, at least
+    one."""
+    def time_is_up(i):
+        return i and deadline is not None and time.perf_counter() > deadline
+
+    scores = []
+    if backend == 'numpy':
+        if np is None:
+            raise ImportError('The numpy backend requires NumPy.')
+        # One chunk of guesses at a time against the clock
+        chunk = len(guesses) if deadline is None else 256
+        for i in range(0, len(guesses), chunk):
+            if time_is_up(i):
+                break
+            part = guesses[i:i + chunk]
+            hist = partition_histograms(
+                part, codes, table, spec=spec,
+                progress=progress if deadline is None else None)
+            if deadline is not None and progress is not None:
+                progress(i + len(part), len(guesses))
+            scores.extend(strategy.scores(hist).tolist())
+    elif table is None:
+        # Same scores, counting packed responses computed in bulk
+        for i, g in enumerate(guesses):
+            if progress is not None and i % 64 == 0:
+                progress(i, len(guesses))
+            if time_is_up(i):
+                break
+            counts = Counter(get_responses(g, codes, spec))
+            scores.append(strategy.score(list(counts.values())))
+    else:
+        # Same scores, counting packed responses looked up in the table
+        for i, g in enumerate(guesses):
+            if progress is not None and i % 256 == 0:
+                progress(i, len(guesses))
+            if time_is_up(i):
+                break
+            row = table.row(g)
+            counts = Counter(map(row.__getitem__, codes))
+            scores.append(strategy.score(list(counts.values())))
+    if backend != 'numpy' and progress is not None:
+        progress(len(scores), len(guesses))
+    return scores
+
+
+def _score_shards(executor, guesses, codes, table, backend, strategy,
+                  spec=CLASSIC, progress=None, deadline=None, shard=256):
+    """Same as `_score_guesses`, the guesses being split in shards of
+    `shard` guesses scored at once by the `executor`. The scores are
+    merged in the order of the guesses, which gives the same best guess
+    as scoring them in turn."""
+    futures = [executor.submit(_score_guesses, guesses[i:i + shard], codes,
+                               table, backend, strategy, spec, None,
+                               deadline)
+               for i in range(0, len(guesses), shard)]
+    scores = []
+    try:
+        for i, future in enumerate(futures):
+            if i and deadline is not None and time.perf_counter() > deadline:
+                break
+            shard_scores = future.result()
+            scores.extend(shard_scores)
+            if progress is not None:
+                progress(len(scores), len(guesses))
+            # A shard that ran out of time ends the guesses scored
+            if len(shard_scores) < len(guesses[i * shard:(i + 1) * shard]):
+                break
+    finally:
+        for future in futures:
+            future.cancel()
+    return scores
+
+
+def get_next_guess_sampled(spec, history, strategy='minimax', verbose=False,
+                           stats=None):
+    """Next guess on boards too large to keep the sets S and T, from
+    the `history` of the moves played, see `consistent_codes`.
+
+    Up to `spec.max_codes` codes consistent with the history are
+    sampled, each one the first found by a search in a random order.
+    The first `spec.max_guesses` of them are scored against the sample
+    by the `strategy` and the best one is returned. Without
+    `max_codes`, the first code found is returned, a random consistent
+    guess. Samples are seeded by `spec.seed` and the history, so the
+    same game is played again for the same code. None if no code is
+    consistent with the history.
+    """
+    if isinstance(strategy, str):
+        strategy = STRATEGIES[strategy]
+    rng = random.Random(f'{spec.seed} {history}')
+    sample = {}
+    for _ in range(spec.max_codes or 1):
+        code = next(consistent_codes(spec, history, rng), None)
+        if code is None:
+            return None
+        sample[code] = None
+    codes = list(sample)
+    guesses = codes[:spec.max_guesses]
+    if stats is not None:
+        stats['source'] = 'solver'
+        stats['score_evaluations'] = len(guesses) * len(codes)
+    if verbose:
+        print(f'    sampled {len(codes)} consistent codes')
+    if len(codes) <= 2:
+        return codes[0]
+
+    scores = [strategy.score(list(Counter(
+                  get_response(g, c) for c in codes).values()))
+              for g in guesses]
+    return guesses[scores.index(min(scores))]
+
+
+def get_next_guess_iteractive(spec=CLASSIC):
     """In an iteractive game, human gives next guess"""
     while True:
         guess = input('    Next guess: ')
         
-        if (len(guess) == 4 and
-            set(guess).issubset(set(PEGS))
-        ):
+        if spec.is_valid_guess(guess):
             return guess
         else:
             print('Invalid guess. Again...')
 
 
+def print_turn_stats(stats, file=sys.stdout):
+    """Print a `TurnStats`, e.g. as the `on_turn` hook of a session."""
+    if stats.S is None:
+        print(f'    turn {stats.turn}: {stats.source} guess', file=file)
+        return
+    print(f'    turn {stats.turn}: |S| {stats.S} (-{stats.removed}), '
+          f'|T| {stats.T}, '
+          f'prune {stats.prune_time * 1e3:.2f} ms '
+          f'({stats.prune_evaluations} responses), '
+          f'score {stats.score_time * 1e3:.2f} ms '
+          f'({stats.score_evaluations} responses, {stats.source}'
+          + (f', {stats.evaluated:.0%} of the guesses)'
+             if stats.evaluated < 1 else ')'),
+          file=file)
+
+
+@contextlib.contextmanager
+def profile(filename=None):
+    """Profile the block with cProfile, and dump the statistics to
+    `filename`, to be read with `pstats`. Does nothing if `filename` is
+    None."""
+    if filename is None:
+        yield
+        return
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(filename)
+
+
+def add_solver_arguments(parser):
+    """Add the solver options shared by the command lines to the
+    `argparse` `parser`, see `solver_options`."""
+    parser.add_argument('-t', '--table', action='store_const',
+                        help='Precompute the responses of all pairs of '
+                             'codes and solve using table lookups.',
+                        const=True, default=False)
+    parser.add_argument('--table-file', type=str, default=None,
+                        help='Response table file, memory-mapped, built '
+                             'if missing or stale. Implies -t.')
+    parser.add_argument('--backend', choices=['python', 'numpy'],
+                        default='python',
+                        help='Minimax scoring backend.')
+    parser.add_argument('-s', '--strategy', choices=list(STRATEGIES),
+                        default='minimax',
+                        help='How guesses are scored: Knuth minimax, '
+                             'expected part size, entropy or most parts.')
+    parser.add_argument('--tree', type=str, default=None,
+                        help='Strategy tree file to follow, '
+                             'see strategy_tree.py.')
+
+
+def solver_options(args, spec=CLASSIC):
+    """Board and solver settings of the options added by
+    `add_solver_arguments`, as a tuple of the `GameSpec` and a dict of
+    `table`, `backend`, `strategy` and `tree`, those given.
+
+    The strategy tree is loaded first: its board replaces `spec` and
+    its strategy the one of the options. The response table is then
+    built or loaded for that board.
+    """
+    options = {'backend': args.backend, 'strategy': args.strategy}
+    if args.tree:
+        from strategy_tree import StrategyTree
+        options['tree'] = StrategyTree.load(args.tree)
+        spec = options['tree'].spec
+        options['strategy'] = options['tree'].strategy
+    if args.table_file:
+        options['table'] = ResponseTable.load(args.table_file, spec)
+    elif args.table:
+        options['table'] = ResponseTable(spec)
+    return spec, options
+
+
+# Settings of the worker processes of batch.py, evaluate.py and
+# server.py, see `init_worker`.
+WORKER = {}
+
+
+def init_worker(spec, options):
+    """Initializer of a worker process, keeping the board `spec` and
+    the solver `options` in `WORKER`, so they are sent once per process
+    rather than with each task."""
+    WORKER['spec'] = spec
+    WORKER['options'] = options
+
+
+class GameSession:
+    """One game on the board `spec`, independent of any front-end.
+
+    The code breaker plays with `submit_guess`. If the `code` is known,
+    the response is computed right away, otherwise the code keeper gives
+    it with `submit_response`. `next_guess` is the solver's guess for
+    the moves played so far.
+
+    The state is the moves played, as code indices and packed
+    responses, and the candidate sets S and T, pruned lazily when the
+    solver needs them. `snapshot` and `restore` save and set it back.
+
+    The solver settings, `table`, `backend`, `tree`, `cache`, `strategy`,
+    `incremental`, `symmetry`, `time_budget`, `executor` and `lazy`, are
+    as in `mastermind`. A `lazy` session has no S and T, its guesses
+    are from `get_next_guess_sampled`. The strategy tree is only
+    followed if it was built with `strategy`.
+
+    If `on_turn` is given, it is called with the `TurnStats` of each
+    guess computed by `next_guess`.
+
+    If a `gamelog.GameLog` is given, the game is logged move by move,
+    from the first one.
+    """
+
+    __slots__ = ('spec', 'code', 'table', 'backend', 'tree', 'cache',
+                 'strategy', 'partitions', 'symmetry', 'time_budget',
+                 'executor', 'lazy', 'on_turn', 'log', 'game', 'S', 'T',
+                 'pruned', 'undo_stack', 'guesses', 'responses', 'pending')
+
+    def __init__(self, spec=CLASSIC, code=None, table=None,
+                 backend='python', tree=None, cache=None,
+                 strategy='minimax', incremental=False, on_turn=None,
+                 symmetry=False, log=None, time_budget=None,
+                 executor=None, lazy=False):
+        if code is not None and not spec.is_valid_guess(code):
+            raise ValueError(f'Invalid code {code!r}.')
+        if tree is not None and tree.spec != spec:
+            raise ValueError('The strategy tree is for another board.')
+        self.spec = spec
+        self.code = code
+        self.table = table
+        self.backend = backend
+        self.tree = tree
+        self.cache = cache
+        self.strategy = strategy
+        self.partitions = Partitions(spec, table) if incremental else None
+        self.symmetry = symmetry
+        self.time_budget = time_budget
+        self.executor = executor
+        self.lazy = lazy
+        self.on_turn = on_turn
+        self.log = log
+        # id of the game in the log
+        self.game = None
+        self.S = None if lazy else CodeSet(spec)
+        self.T = None if lazy else self.S.copy()
+        # number of moves S and T have been pruned for, and their bits
+        # before pruning each of these moves, to undo them
+        self.pruned = 0
+        self.undo_stack = []
+        self.guesses = []
+        self.responses = bytearray()
+        # guess waiting for its response
+        self.pending = None
+
+    def __len__(self):
+        return len(self.guesses)
+
+    @property
+    def solved(self):
+        return (bool(self.responses) and
+                self.spec.is_solved(self.spec.unpack_response(
+                    self.responses[-1])))
+
+    def history(self):
+        """Moves played, a list of (guess, (blacks, whites))."""
+        return [(self.spec.decode(g), self.spec.unpack_response(r))
+                for g, r in zip(self.guesses, self.responses)]
+
+    def submit_guess(self, guess):
+        """Play `guess`. Return its response if the code is known,
+        otherwise None until `submit_response` is called."""
+        if self.solved:
+            raise ValueError('The game is over.')
+        if self.pending is not None:
+            raise ValueError('Waiting for the response to the last guess.')
+        if not self.spec.is_valid_guess(guess):
+            raise ValueError(f'Invalid guess {guess!r}.')
+        self.pending = self.spec.encode(guess)
+        if self.code is None:
+            return None
+        resp = get_response(guess, self.code)
+        self.submit_response(resp)
+        return resp
+
+    def submit_response(self, resp, check=False):
+        """Response (blacks, whites) to the guess played. With `check`,
+        the response must be one of the `possible_responses`."""
+        if self.pending is None:
+            raise ValueError('No guess to respond to.')
+        resp = tuple(resp)
+        if not self.spec.is_valid_response(resp):
+            raise ValueError(f'Invalid response {resp}.')
+        if check and not self.is_consistent(resp):
+            if self.lazy:
+                raise ValueError(
+                    f'Response {resp} contradicts the previous ones.')
+            possible = self.possible_responses()
+            raise ValueError(
+                f'Response {resp} contradicts the previous ones, '
+                f'possible responses: '
+                f'{", ".join(map(str, possible)) or "none"}.')
+        self.guesses.append(self.pending)
+        self.responses.append(self.spec.pack_response(resp))
+        self.pending = None
+        if self.log is not None:
+            if self.game is None:
+                self.game = self.log.start(self.spec, self.code)
+            self.log.move(self.game, len(self.guesses),
+                          self.spec.decode(self.guesses[-1]), resp)
+            if self.solved:
+                self.log.end(self.game, True, len(self.guesses))
+
+    def is_consistent(self, resp):
+        """Whether some code consistent with the moves played gives the
+        response `resp` to the guess waiting for its response."""
+        if not self.lazy:
+            return tuple(resp) in self.possible_responses()
+        history = self.history() + [(self.spec.decode(self.pending),
+                                     tuple(resp))]
+        return next(consistent_codes(self.spec, history), None) is not None
+
+    def possible_responses(self, guess=None):
+        """Responses to `guess`, by default the guess waiting for its
+        response, that some code consistent with the moves played would
+        give. Sorted (blacks, whites) tuples, computed in O(|S|). Not
+        available on lazy sessions."""
+        if self.lazy:
+            raise ValueError('A lazy session has no set S.')
+        spec = self.spec
+        if guess is None and self.pending is None:
+            raise ValueError('No guess to respond to.')
+        guess = self.pending if guess is None else spec.encode(guess)
+        S, _ = self.candidates()
+        if self.table is None:
+            responses = set(get_responses(guess, S.indices(), spec))
+        else:
+            row = self.table.row(guess)
+            responses = {row[c] for c in S}
+        return sorted(spec.unpack_response(r) for r in responses)
+
+    def undo(self):
+        """Take back the guess waiting for its response if any,
+        otherwise the last move. S and T are set back to their bits
+        before that move was pruned."""
+        if self.pending is not None:
+            self.pending = None
+            return
+        if not self.guesses:
+            raise ValueError('No move to undo.')
+        if self.solved:
+            raise ValueError('The game is over.')
+        self.guesses.pop()
+        self.responses.pop()
+        if self.pruned > len(self.guesses):
+            if len(self.undo_stack) == self.pruned:
+                S, T = self.undo_stack.pop()
+                self.S = CodeSet(self.spec, S)
+                self.T = CodeSet(self.spec, T)
+                self.pruned -= 1
+            else:
+                # e.g. after `restore` of a state without its undo
+                # stack, prune again from the start
+                self.S = CodeSet(self.spec)
+                self.T = self.S.copy()
+                self.pruned = 0
+                self.undo_stack = []
+        if self.log is not None and self.game is not None:
+            self.log.undo(self.game)
+
+    def end(self):
+        """Log the end of a game given up before breaking the code."""
+        if self.log is not None and self.game is not None and not self.solved:
+            self.log.end(self.game, False, len(self.guesses))
+
+    def candidates(self, verbose=False, stats=None):
+        """The sets S and T, pruned for the moves played. If a dict
+        `stats` is given, the number of responses evaluated is added to
+        its 'prune_evaluations'."""
+        for g, r in zip(self.guesses[self.pruned:],
+                        self.responses[self.pruned:]):
+            if stats is not None:
+                stats['prune_evaluations'] += len(self.S)
+            self.undo_stack.append((self.S.bits, self.T.bits))
+            prune(self.S, self.T, g, self.spec.unpack_response(r), verbose,
+                  self.table)
+        self.pruned = len(self.guesses)
+        return self.S, self.T
+
+    def next_guess(self, verbose=False, progress=None):
+        """The solver's next guess. None if no code is consistent with
+        the responses given. `progress` is as in `get_next_guess`."""
+        if self.on_turn is None:
+            return self._next_guess(verbose, progress)
+
+        stats = dict(turn=len(self.guesses) + 1, S=None, T=None, removed=0,
+                     prune_time=0.0, score_time=0.0, prune_evaluations=0,
+                     score_evaluations=0, source='first', evaluated=1.0)
+        guess = self._next_guess(verbose, progress, stats)
+        self.on_turn(TurnStats(**stats))
+        return guess
+
+    def _next_guess(self, verbose, progress, stats=None):
+        tree = self.tree
+        if tree is not None and tree.strategy != self.strategy:
+            tree = None
+        if not self.guesses:
+            return tree.first_guess if tree else self.spec.default_guess()
+        # The tree is keyed by the responses only, it is left as soon as
+        # a guess played is not its own, e.g. one of a human or of
+        # another strategy.
+        key = bytes(self.responses)
+        if tree is not None and all(tree.moves.get(key[:i]) == g
+                                    for i, g in enumerate(self.guesses)):
+            guess = tree.moves.get(key)
+            if guess is not None:
+                if stats is not None:
+                    stats['source'] = 'tree'
+                return self.spec.decode(guess)
+
+        if self.lazy:
+            start = time.perf_counter()
+            guess = get_next_guess_sampled(self.spec, self.history(),
+                                           self.strategy, verbose, stats)
+            if stats is not None:
+                stats['score_time'] = time.perf_counter() - start
+            return guess
+
+        if stats is None:
+            S, T = self.candidates(verbose)
+        else:
+            size = len(self.S)
+            start = time.perf_counter()
+            S, T = self.candidates(verbose, stats)
+            stats['prune_time'] = time.perf_counter() - start
+            stats['S'], stats['T'] = len(S), len(T)
+            stats['removed'] = size - stats['S']
+        if not S:
+            return None
+
+        start = time.perf_counter()
+        guess = get_next_guess(S, T, verbose, self.table, self.backend,
+                               self.cache, self.partitions, self.strategy,
+                               progress, stats, self.symmetry,
+                               self.time_budget, self.executor)
+        if stats is not None:
+            stats['score_time'] = time.perf_counter() - start
+        return None if guess is None else self.spec.decode(guess)
+
+    def snapshot(self):
+        """The state of the game as a `SessionState`, immutable and
+        sharing nothing with the session."""
+        if self.lazy:
+            return SessionState(None, None, 0, tuple(self.guesses),
+                                bytes(self.responses), self.pending)
+        return SessionState(self.S.bits, self.T.bits, self.pruned,
+                            tuple(self.guesses), bytes(self.responses),
+                            self.pending, tuple(self.undo_stack))
+
+    def restore(self, state):
+        """Set back the state of a `snapshot`, of a session on the
+        same board."""
+        if not self.lazy:
+            self.S = CodeSet(self.spec, state.S)
+            self.T = CodeSet(self.spec, state.T)
+        self.pruned = state.pruned
+        self.undo_stack = list(state.undo_stack)
+        self.guesses = list(state.guesses)
+        self.responses = bytearray(state.responses)
+        self.pending = state.pending
+
+    def copy(self):
+        """Session with the same settings and state. Incremental
+        partitions are not shared."""
+        other = object.__new__(type(self))
+        for name in self.__slots__:
+            setattr(other, name, getattr(self, name))
+        if self.partitions is not None:
+            other.partitions = Partitions(self.spec, self.table)
+        other.restore(self.snapshot())
+        return other
+
+
 def mastermind(
-    guess='rrgg', 
+    guess=None, 
     code='ycmb', 
     iteractive_codekeeper=False, 
     iteractive_codebreaker=False,
     verbose=False,
+    table=None,
+    backend='python',
+    spec=CLASSIC,
+    tree=None,
+    quiet=False,
+    cache=None,
+    incremental=False,
+    strategy='minimax',
+    on_turn=None,
+    symmetry=False,
+    log=None,
+    time_budget=None,
+    executor=None,
+    lazy=False,
 ):
     """Mastermind - Knuth algorithm to break the code.
 
-    Implemented 6 colours, 4 pegs. Repeating colours is allowed.
+    The board is given by `spec`, by default 6 colours, 4 pegs.
+    Repeating colours is allowed. The first guess defaults to 'rrgg',
+    see `GameSpec.default_guess`.
+
+    If a `ResponseTable` is given, pruning and scoring use table
+    lookups rather than calling `get_response`.
+
+    `backend` selects how the minimax scores are computed: 'python'
+    loops over the guesses, 'numpy' computes all the partition
+    histograms in bulk with `partition_histograms`.
+
+    If a `strategy_tree.StrategyTree` is given, the computer guesses
+    are looked up in the tree, and scored with the tree's strategy if
+    the responses leave it, e.g. inconsistent responses from a human
+    keeper.
+
+    The game state is kept in a `GameSession`.
+
+    A `cache.GuessCache` memoizes the guesses across games.
+
+    `strategy` is how the guesses are scored, see `STRATEGIES`.
+
+    If `incremental`, the responses are kept across turns and narrowed,
+    see `Partitions`.
+
+    `on_turn` is called with the `TurnStats` of each computer guess.
+
+    With `symmetry`, guesses equivalent up to a permutation of the
+    colours and positions are only scored once, see `get_next_guess`.
+
+    The moves are written to the `gamelog.GameLog` `log` if given.
+
+    With a `time_budget` in seconds, each computer guess is the best of
+    the guesses scored in that time, see `get_next_guess`.
+
+    The guesses of each turn are scored in parallel by the
+    `concurrent.futures.Executor` `executor` if given.
+
+    With `lazy`, the sets S and T are not built, which is required on
+    boards too large to hold them, the guesses are sampled from the
+    codes consistent with the moves, see `get_next_guess_sampled`.
+
+    Returns a `GameResult`. The game is printed unless `quiet` is set.
     """
 
-    # 1. Create the set S of 1,296 possible codes
-    S = list(itertools.product(PEGS, repeat=4))
-    T = S[:]
-    if verbose:
-        print(f'    S has {len(S)} elements.')
+    if tree is not None:
+        strategy = tree.strategy
+        if guess is None:
+            guess = tree.first_guess
+        elif guess != tree.first_guess:
+            raise ValueError('The strategy tree starts with '
+                             f'{tree.first_guess}, not {guess}.')
 
     if iteractive_codebreaker:
-        guess = get_next_guess_iteractive()
+        guess = get_next_guess_iteractive(spec)
+    elif guess is None:
+        guess = spec.default_guess()
+
+    # 1. Create the set S of 1,296 possible codes. The session prunes
+    # it lazily, so not at all while following a tree.
+    session = GameSession(spec, None if iteractive_codekeeper else code,
+                          table, backend, tree, cache, strategy, incremental,
+                          on_turn, symmetry, log, time_budget, executor,
+                          lazy)
+    if verbose and not lazy:
+        print(f'    S has {len(session.S)} elements.')
+    result = GameResult([], [], [])
 
     count = 0
     while True:
         count += 1
         if count > 12:
-            print('Code not found.')
-            return
+            if not quiet:
+                print('Code not found.')
+            session.end()
+            return result
 
         # 3. Play the guess to get a response
-        print(f'[{count}] {guess=} ', end='')
+        if not quiet:
+            print(f'[{count}] {guess=} ', end='')
         if not iteractive_codekeeper:
-            resp = get_response(guess, code)
+            resp = session.submit_guess(guess)
             blacks, whites = resp
-            print(f'-> {blacks=}, {whites=}')
+            if not quiet:
+                print(f'-> {blacks=}, {whites=}')
         else:
             print()
-            resp = get_response_iteractive()
+            session.submit_guess(guess)
+            resp = get_response_iteractive(spec, session)
+            while resp is None:
+                # Undo the last move, and play its guess again
+                session.undo()
+                if not session.guesses:
+                    print('    Nothing to undo.')
+                else:
+                    guess = session.history()[-1][0]
+                    session.undo()
+                    del result.guesses[-1], result.responses[-1]
+                    count -= 1
+                    print(f'[{count}] {guess=} ')
+                session.submit_guess(guess)
+                resp = get_response_iteractive(spec, session)
+            session.submit_response(resp)
             blacks, whites = resp
+        result.guesses.append(guess)
+        result.responses.append(resp)
 
         # 4. If the response is four colored key pegs, the game is won
-        if blacks == 4:
-            print(f'The code is {guess}.')
-            return
+        if spec.is_solved(resp):
+            if not quiet:
+                print(f'The code is {guess}.')
+            return result
 
         if not iteractive_codebreaker:
-            prune(S, T, guess, resp, verbose)
-            guess = get_next_guess(S, T, verbose)
+            start = time.perf_counter()
+            guess = session.next_guess(verbose)
+            result.move_times.append(time.perf_counter() - start)
         else:
-            guess = get_next_guess_iteractive()
+            guess = get_next_guess_iteractive(spec)
 
         assert guess is not None
 
@@ -233,10 +1703,21 @@ def main():
     parser = argparse.ArgumentParser(description="Mastermind's Knuth algorithm.")
     parser.add_argument('-v', '--verbose', action='store_const',
                         const=True, default=False)
-    parser.add_argument('-g', '--guess', type=str, default='rrgg', nargs='?',
-                        help='First guess.')
-    parser.add_argument('-c', '--code', type=str, default='ycmb', nargs='?',
-                        help='Code to be broken.')
+    parser.add_argument('-g', '--guess', type=str, default=None, nargs='?',
+                        help='First guess. Defaults to rrgg, or the '
+                             'same pattern on other boards.')
+    parser.add_argument('-c', '--code', type=str, default=None, nargs='?',
+                        help='Code to be broken. Defaults to ycmb, '
+                             'random on other boards.')
+    parser.add_argument('-n', '--positions', type=int, default=4,
+                        help='Number of pegs per code.')
+    parser.add_argument('--colours', type=str, default=PEGS,
+                        help='Available colours, one letter each.')
+    parser.add_argument('--max-guesses', type=int, default=None,
+                        help='Score at most this many guesses per turn.')
+    parser.add_argument('--max-codes', type=int, default=None,
+                        help='Score guesses against at most this many '
+                             'codes per turn.')
     parser.add_argument('-k', '--iteractive_codekeeper', action='store_const',
                         help='Play the game as code keeper. '
                              ' User inputs the response per guess.',
@@ -245,15 +1726,92 @@ def main():
                         help='Play the game as code breaker. '
                              ' User inputs the next guess.',
                         const=True, default=False)
+    add_solver_arguments(parser)
+    parser.add_argument('-i', '--incremental', action='store_const',
+                        help='Narrow the responses of the previous turn '
+                             'rather than evaluating them. Needs NumPy.',
+                        const=True, default=False)
+    parser.add_argument('--cache', type=str, default=None,
+                        help='Cache file of the guesses, reused and '
+                             'updated across runs.')
+    parser.add_argument('-y', '--symmetry', action='store_const',
+                        help='Only score one guess per class of guesses '
+                             'equivalent by symmetry.',
+                        const=True, default=False)
+    parser.add_argument('-j', '--workers', type=int, default=None,
+                        help='Score the guesses of each turn over this '
+                             'number of processes.')
+    parser.add_argument('--time-budget', type=float, default=None,
+                        help='Seconds to score the guesses of each turn, '
+                             'the best guess found so far is played.')
+    parser.add_argument('-l', '--lazy', action='store_const',
+                        help='Play codes consistent with the responses '
+                             'without building S and T, for huge boards. '
+                             'Sample --max-codes of them and score '
+                             '--max-guesses.',
+                        const=True, default=False)
+    parser.add_argument('--log', type=str, default=None,
+                        help='Append the game to this log file, see '
+                             'gamelog.py.')
+    parser.add_argument('--stats', action='store_const',
+                        help='Print the time and work of each turn.',
+                        const=True, default=False)
+    parser.add_argument('--profile', type=str, default=None,
+                        help='Dump cProfile statistics of the game to '
+                             'this file.')
     args = parser.parse_args()
 
-    mastermind(
-        guess=args.guess, 
-        code=args.code, 
-        verbose=args.verbose,
-        iteractive_codekeeper=args.iteractive_codekeeper,
-        iteractive_codebreaker=args.iteractive_codebreaker,
-    )
+    spec, options = solver_options(args, GameSpec(
+        args.positions, args.colours, max_guesses=args.max_guesses,
+        max_codes=args.max_codes))
+    if spec == CLASSIC:
+        code = args.code or 'ycmb'
+    else:
+        code = args.code or spec.random_code()
+    for c in (args.guess, code):
+        if c is not None and not spec.is_valid_guess(c):
+            parser.error(f'invalid code {c!r} for this board.')
+
+    cache = None
+    if args.cache:
+        from cache import GuessCache
+        cache = GuessCache(filename=args.cache)
+    log = None
+    if args.log:
+        from gamelog import GameLog
+        log = GameLog(args.log)
+
+    executor = None
+    if args.workers:
+        from concurrent.futures import ProcessPoolExecutor
+        executor = ProcessPoolExecutor(args.workers)
+
+    with profile(args.profile):
+        mastermind(
+            guess=args.guess,
+            code=code,
+            verbose=args.verbose,
+            iteractive_codekeeper=args.iteractive_codekeeper,
+            iteractive_codebreaker=args.iteractive_codebreaker,
+            spec=spec,
+            cache=cache,
+            incremental=args.incremental,
+            on_turn=print_turn_stats if args.stats else None,
+            symmetry=args.symmetry,
+            log=log,
+            time_budget=args.time_budget,
+            executor=executor,
+            lazy=args.lazy,
+            **options,
+        )
+
+    if executor is not None:
+        executor.shutdown()
+
+    if cache is not None:
+        if args.verbose:
+            print(f'    {cache}')
+        cache.save()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,228 @@
+"""
+Search of a strategy tree with the fewest guesses on average.
+
+Knuth's minimax, like the other greedy strategies of `mastermind2`,
+picks each guess from the partition it makes of the codes left, one
+move ahead. This module searches the whole game instead: the cost of a
+guess is the total number of guesses needed to break every code of S
+with it, computed recursively, and the guess of least cost is kept.
+
+The search is a depth first branch and bound:
+
+  - the candidate guesses of a node are ranked by a greedy strategy,
+    and only the `width` best ones are searched in the first `levels`
+    moves, only the best one below. With enough width and levels, the
+    tree is optimal, with less, it is a good strategy found quickly;
+  - a guess is abandoned as soon as the cost of the parts searched so
+    far, plus a lower bound of the cost of the others, exceeds the
+    best guess found;
+  - the first guess is only searched up to a permutation of the colours
+    and positions, e.g. rrgg stands for bbyy, grgr, ...;
+  - costs are memoized per set of codes, many histories leaving the
+    same codes.
+
+The result is saved as a `strategy_tree.StrategyTree`, to be replayed
+by `mastermind2.py --tree` or the benchmark:
+
+    python optimal.py -w 5 -l 2 -o optimal_tree.json
+    python benchmark.py -t --tree optimal_tree.json
+
+Requires NumPy.
+"""
+
+import time
+import argparse
+
+import mastermind2 as mm
+from mastermind2 import np
+from strategy_tree import StrategyTree
+
+
+class Search:
+    """Branch and bound search of the strategy tree of least cost.
+
+    `strategy` ranks the candidate guesses of each node, `width` of
+    them are searched in the first `levels` moves, all of them if
+    `width` is 0, see the module docstring.
+    """
+
+    def __init__(self, spec=mm.CLASSIC, table=None, strategy='expected',
+                 width=5, levels=2):
+        if np is None:
+            raise ImportError('The optimal search requires NumPy.')
+        self.spec = spec
+        self.table = table if table is not None else mm.ResponseTable(spec)
+        self.matrix = np.frombuffer(self.table.data, dtype=np.uint8).reshape(
+            self.table.size, self.table.size)
+        self.strategy = mm.STRATEGIES[strategy]
+        self.width = width
+        self.levels = levels
+        self.guesses = np.arange(spec.num_codes)
+        self.solved = spec.pack_response((spec.positions, 0))
+        # Responses other than the solved one
+        parts = sum(spec.is_valid_response((b, w))
+                    for b in range(spec.positions + 1)
+                    for w in range(spec.positions + 1)) - 1
+        # Number of codes that can be broken in exactly d guesses,
+        # at most, for d = 1, 2, ...
+        self.capacity = [1]
+        while sum(self.capacity) < spec.num_codes:
+            self.capacity.append(self.capacity[-1] * parts)
+        self.memo = {}
+        self.nodes = 0
+
+    def lower_bound(self, n):
+        """Least total number of guesses to break `n` codes, breaking
+        as many codes as possible at each depth."""
+        cost = 0
+        for depth, num in enumerate(self.capacity, 1):
+            if n <= num:
+                return cost + depth * n
+            cost += depth * num
+            n -= num
+        return cost
+
+    def candidates(self, codes, level):
+        """Guesses to search for the `codes`, best ranked first."""
+        width = (self.width or None) if level < self.levels else 1
+        if level == 0:
+            guesses = np.array(first_guesses(self.spec))
+        else:
+            guesses = self.guesses
+        hist = mm.partition_histograms(guesses, codes, self.table,
+                                       spec=self.spec)
+        in_codes = np.zeros(self.spec.num_codes, dtype=bool)
+        in_codes[codes] = True
+        in_codes = in_codes[guesses]
+        # Guesses not splitting the codes are useless
+        useful = in_codes | (hist.max(axis=1) < len(codes))
+        scores = self.strategy.scores(hist)
+        # Best score first, then codes that might be the secret
+        order = np.lexsort((~in_codes, scores))
+        order = order[useful[order]]
+        return guesses[order[:width]].tolist()
+
+    def parts(self, guess, codes):
+        """The codes split by the response to `guess`, except the one
+        breaking the code, smallest first."""
+        resp = self.matrix[guess, codes]
+        parts = [codes[resp == r] for r in np.unique(resp) if r != self.solved]
+        parts.sort(key=len)
+        return parts
+
+    def cost(self, codes, level=0):
+        """Least total number of guesses to break all the `codes`, a
+        sorted array of code indices, and the best first guess."""
+        n = len(codes)
+        if n == 1:
+            return 1, int(codes[0])
+        key = (codes.tobytes(), min(level, self.levels))
+        if key in self.memo:
+            return self.memo[key]
+        self.nodes += 1
+
+        lower = self.lower_bound(n)
+        best_cost, best_guess = float('inf'), None
+        for guess in self.candidates(codes, level):
+            parts = self.parts(guess, codes)
+            # every code gets this guess, then the guesses of its part
+            bound = n + sum(self.lower_bound(len(p)) for p in parts)
+            if bound >= best_cost:
+                continue
+            total = n
+            for p in parts:
+                c, _ = self.cost(p, level + 1)
+                total += c
+                bound += c - self.lower_bound(len(p))
+                if bound >= best_cost:
+                    break
+            else:
+                best_cost, best_guess = total, guess
+                if best_cost == lower:
+                    break
+
+        self.memo[key] = best_cost, best_guess
+        return best_cost, best_guess
+
+    def build(self, guess=None):
+        """Best strategy tree, starting with `guess` if given. Returns
+        the total number of guesses to break every code, and the tree
+        as a `StrategyTree`. The tree falls back on the ranking strategy
+        if a game leaves it."""
+        spec = self.spec
+        if guess is None:
+            _, first = self.cost(self.guesses)
+        else:
+            first = spec.encode(guess)
+        moves = {}
+        total = 0
+
+        def expand(key, guess, codes, level):
+            nonlocal total
+            moves[key] = guess
+            total += len(codes)
+            for p in self.parts(guess, codes):
+                resp = int(self.matrix[guess, p[0]])
+                _, next_guess = self.cost(p, level + 1)
+                expand(key + bytes([resp]), next_guess, p, level + 1)
+
+        expand(b'', first, self.guesses, 0)
+        return total, StrategyTree(moves, spec, self.strategy.name)
+
+
+def first_guesses(spec):
+    """One code per class of first guesses equivalent up to permutations
+    of the colours and positions: the patterns of repeated colours, e.g.
+    aabb and aabc, with colours in order of first use."""
+    guesses = []
+
+    def patterns(prefix, left, largest):
+        if left == 0:
+            if len(prefix) <= len(spec.colours):
+                guesses.append(''.join(c * k for c, k in
+                                       zip(spec.colours, prefix)))
+            return
+        for k in range(min(left, largest), 0, -1):
+            patterns(prefix + [k], left - k, k)
+
+    patterns([], spec.positions, spec.positions)
+    return sorted(spec.encode(g) for g in guesses)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Search the strategy tree with the fewest guesses.')
+    parser.add_argument('-o', '--output', type=str,
+                        default='optimal_tree.json', help='Output file.')
+    parser.add_argument('-g', '--guess', type=str, default=None,
+                        help='First guess, searched by default.')
+    parser.add_argument('-n', '--positions', type=int, default=4,
+                        help='Number of pegs per code.')
+    parser.add_argument('--colours', type=str, default=mm.PEGS,
+                        help='Available colours, one letter each.')
+    parser.add_argument('-s', '--strategy', choices=list(mm.STRATEGIES),
+                        default='expected',
+                        help='How the candidate guesses are ranked.')
+    parser.add_argument('-w', '--width', type=int, default=5,
+                        help='Candidate guesses searched per move, '
+                             '0 for all.')
+    parser.add_argument('-l', '--levels', type=int, default=2,
+                        help='Number of moves searched with the full '
+                             'width, the best ranked guess only below.')
+    args = parser.parse_args()
+
+    spec = mm.GameSpec(args.positions, args.colours)
+    search = Search(spec, strategy=args.strategy, width=args.width,
+                    levels=args.levels)
+    start = time.perf_counter()
+    cost, tree = search.build(args.guess)
+    print(f'Searched {search.nodes} sets of codes in '
+          f'{time.perf_counter() - start:.1f} s.')
+    print(f'Total {cost} guesses, {cost / spec.num_codes:.4f} on average, '
+          f'first guess {tree.first_guess}.')
+    tree.save(args.output)
+    print(f'Saved {len(tree)} moves to {args.output}.')
+
+
+if __name__ == '__main__':
+    main()
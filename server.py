@@ -0,0 +1,243 @@
+"""
+Mastermind game server: many games at once over a TCP line protocol.
+
+    python server.py --port 7777 -t
+
+Each connection plays one game at a time. Commands and replies are
+lines of text:
+
+    BREAK              the server breaks a code kept by the client
+      NEXT             -> GUESS <code>, the server's next guess
+      RESPONSE <b> <w> -> OK, or SOLVED <n> after n guesses
+    KEEP               the server keeps a random code
+      GUESS <code>     -> RESPONSE <b> <w>
+    QUIT
+
+Errors are replied with ERR <message>. The server's guesses, and the
+checks of the responses against the moves played, are computed by a
+pool of worker processes, so a slow move of one game never stalls the
+others. At most `--max-pending` moves are computed at once, including
+those whose reply timed out, the other games wait for their turn, and
+at most `--max-sessions`
+connections are served. Idle connections are closed after `--timeout`
+seconds.
+
+See loadtest.py to measure how many games per second are served.
+"""
+
+import os
+import asyncio
+import argparse
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import mastermind2 as mm
+
+
+def _session(state):
+    session = mm.GameSession(mm.WORKER['spec'], **mm.WORKER['options'])
+    session.restore(state)
+    return session
+
+
+def _next_guess(state):
+    """Next guess of a session in the `state` of its snapshot. The new
+    state, with S and T pruned, is returned with the guess."""
+    session = _session(state)
+    guess = session.next_guess()
+    return guess, session.snapshot()
+
+
+def _submit_response(state, resp):
+    """New state of a session in the `state` of its snapshot, once the
+    response `resp` is checked against the moves played and submitted.
+    """
+    session = _session(state)
+    session.submit_response(resp, check=True)
+    return session.snapshot()
+
+
+class GameServer:
+    """Asyncio server of Mastermind games, see the module docstring.
+
+    The guesses are computed by `workers` processes, by default one per
+    CPU. With `workers=0`, they are computed by a thread of the server
+    process instead.
+
+    Extra keyword arguments are the solver settings of
+    `mastermind2.GameSession`, shared with the workers once when they
+    start.
+    """
+
+    def __init__(self, spec=mm.CLASSIC, workers=None, max_sessions=1000,
+                 max_pending=None, timeout=60, **options):
+        self.spec = spec
+        self.options = options
+        if workers == 0:
+            self.executor = ThreadPoolExecutor(
+                1, initializer=mm.init_worker,
+                initargs=(spec, options))
+            workers = 1
+        else:
+            workers = workers or os.cpu_count()
+            self.executor = ProcessPoolExecutor(
+                workers, initializer=mm.init_worker,
+                initargs=(spec, options))
+        self.max_sessions = max_sessions
+        self.pending = asyncio.Semaphore(max_pending or 2 * workers)
+        self.timeout = timeout
+        self.sessions = 0
+        self.games = 0
+        self.server = None
+
+    async def start(self, host='127.0.0.1', port=7777):
+        self.server = await asyncio.start_server(self.handle, host, port)
+        return self.server.sockets[0].getsockname()[:2]
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        self.executor.shutdown(cancel_futures=True)
+
+    async def run(self, fn, *args):
+        """Result of `fn(*args)` in the executor, within the timeout.
+        Each call holds a slot of `pending` until it is done, even if
+        its caller timed out, so that no more than `max_pending` calls
+        queue in the executor."""
+        await self.pending.acquire()
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self.executor, fn, *args)
+
+        def done(future):
+            self.pending.release()
+            if not future.cancelled():
+                future.exception()
+
+        future.add_done_callback(done)
+        return await asyncio.wait_for(asyncio.shield(future), self.timeout)
+
+    async def next_guess(self, session):
+        guess, state = await self.run(_next_guess, session.snapshot())
+        session.restore(state)
+        return guess
+
+    async def handle(self, reader, writer):
+        async def reply(line):
+            writer.write(line.encode() + b'\n')
+            await writer.drain()
+
+        if self.sessions >= self.max_sessions:
+            await reply('ERR busy')
+            writer.close()
+            return
+        self.sessions += 1
+        session = None
+        try:
+            while True:
+                line = await asyncio.wait_for(reader.readline(), self.timeout)
+                if not line:
+                    break
+                cmd, *args = line.decode(errors='replace').split() or ['']
+                cmd = cmd.upper()
+                if cmd == 'QUIT':
+                    break
+                try:
+                    session, answer = await self.command(session, cmd, args)
+                except ValueError as e:
+                    answer = f'ERR {e}'
+                await reply(answer)
+        except asyncio.TimeoutError:
+            await reply('ERR timeout')
+        except ConnectionError:
+            pass
+        finally:
+            self.sessions -= 1
+            writer.close()
+
+    async def command(self, session, cmd, args):
+        """Play the command `cmd` with its `args` in the game `session`.
+        Returns the session, new if the command starts a game, and the
+        reply line."""
+        spec = self.spec
+        if cmd == 'BREAK':
+            return mm.GameSession(spec, **self.options), 'OK'
+        if cmd == 'KEEP':
+            return (mm.GameSession(spec, spec.random_code(),
+                                   **self.options), 'OK')
+        if session is None:
+            raise ValueError('no game, send BREAK or KEEP')
+        if len(session) >= 12 and cmd in {'NEXT', 'GUESS'}:
+            raise ValueError('too many guesses')
+
+        if cmd == 'NEXT' and session.code is None:
+            guess = await self.next_guess(session)
+            if guess is None:
+                raise ValueError('no code is consistent with the responses')
+            session.submit_guess(guess)
+            return session, f'GUESS {guess}'
+        if cmd == 'RESPONSE' and session.code is None:
+            try:
+                resp = tuple(int(a) for a in args)
+            except ValueError:
+                raise ValueError('invalid response') from None
+            session.restore(await self.run(
+                _submit_response, session.snapshot(), resp))
+            if session.solved:
+                self.games += 1
+                return session, f'SOLVED {len(session)}'
+            return session, 'OK'
+        if cmd == 'GUESS' and session.code is not None:
+            if len(args) != 1:
+                raise ValueError('invalid guess')
+            blacks, whites = session.submit_guess(args[0])
+            if session.solved:
+                self.games += 1
+            return session, f'RESPONSE {blacks} {whites}'
+        raise ValueError(f'unexpected command {cmd!r}')
+
+
+async def serve(host, port, **kwargs):
+    server = GameServer(**kwargs)
+    host, port = await server.start(host, port)
+    print(f'Serving on {host}:{port}.')
+    try:
+        await server.server.serve_forever()
+    finally:
+        await server.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Serve Mastermind games over TCP.')
+    parser.add_argument('--host', type=str, default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=7777)
+    parser.add_argument('-j', '--workers', type=int, default=None,
+                        help='Number of worker processes, one per CPU '
+                             'by default.')
+    parser.add_argument('--max-sessions', type=int, default=1000,
+                        help='Connections served at once.')
+    parser.add_argument('--max-pending', type=int, default=None,
+                        help='Guesses computed at once, twice the number '
+                             'of workers by default.')
+    parser.add_argument('--timeout', type=float, default=60,
+                        help='Seconds before idle connections are closed.')
+    mm.add_solver_arguments(parser)
+    parser.add_argument('--time-budget', type=float, default=None,
+                        help='Seconds to score the guesses of each move.')
+    args = parser.parse_args()
+
+    spec, kwargs = mm.solver_options(args)
+    kwargs['time_budget'] = args.time_budget
+
+    try:
+        asyncio.run(serve(args.host, args.port, spec=spec,
+                          workers=args.workers,
+                          max_sessions=args.max_sessions,
+                          max_pending=args.max_pending,
+                          timeout=args.timeout, **kwargs))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
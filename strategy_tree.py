@@ -0,0 +1,140 @@
+"""
+Precomputed strategy tree for the Mastermind solver.
+
+For a fixed first guess, the solver is deterministic: the next guess
+only depends on the responses received so far. The whole strategy
+is computed once, saved to a file, and then each move of a game is a
+dictionary lookup instead of a prune and a minimax.
+
+Build the tree with:
+
+    python strategy_tree.py -o knuth_tree.json
+
+and play using it with:
+
+    python mastermind2.py --tree knuth_tree.json
+"""
+
+import json
+import argparse
+
+import mastermind2 as mm
+
+
+FORMAT_VERSION = 1
+
+
+class StrategyTree:
+    """Next guess for every history of responses of a strategy.
+
+    `moves` maps the packed responses received so far, as `bytes`, to
+    the index of the next guess. The empty history maps to the first
+    guess.
+    """
+
+    def __init__(self, moves, spec=mm.CLASSIC, strategy='minimax'):
+        self.moves = moves
+        self.spec = spec
+        self.strategy = strategy
+
+    @property
+    def first_guess(self):
+        return self.spec.decode(self.moves[b''])
+
+    def __len__(self):
+        return len(self.moves)
+
+    def next_guess(self, responses):
+        """Index of the next guess after the `responses` received so
+        far, a list of (blacks, whites). None if the history is not in
+        the tree, e.g. inconsistent responses given by a human.
+        """
+        key = bytes(self.spec.pack_response(r) for r in responses)
+        return self.moves.get(key)
+
+    @classmethod
+    def build(cls, spec=mm.CLASSIC, guess=None, table=None,
+              backend='python', strategy='minimax'):
+        """Play every possible game of the solver, scoring the guesses
+        with `strategy`, see `mastermind2.STRATEGIES`."""
+        if guess is None:
+            guess = spec.default_guess()
+        moves = {}
+
+        def expand(key, guess, S, T):
+            moves[key] = guess
+            if table is None:
+                _guess = spec.decode(guess)
+                responses = {mm.get_response(_guess, spec.decode(c))
+                             for c in S}
+            else:
+                row = table.row(guess)
+                responses = {spec.unpack_response(row[c]) for c in S}
+            for resp in sorted(responses):
+                if spec.is_solved(resp):
+                    continue
+                S1, T1 = S.copy(), T.copy()
+                mm.prune(S1, T1, guess, resp, False, table)
+                next_guess = mm.get_next_guess(S1, T1, False, table, backend,
+                                               strategy=strategy)
+                expand(key + bytes([spec.pack_response(resp)]),
+                       next_guess, S1, T1)
+
+        expand(b'', spec.encode(guess), mm.CodeSet(spec), mm.CodeSet(spec))
+        return cls(moves, spec, strategy)
+
+    def save(self, filename):
+        data = {
+            'version': FORMAT_VERSION,
+            'positions': self.spec.positions,
+            'colours': self.spec.colours,
+            'max_guesses': self.spec.max_guesses,
+            'max_codes': self.spec.max_codes,
+            'seed': self.spec.seed,
+            'strategy': self.strategy,
+            'moves': {k.hex(): v for k, v in self.moves.items()},
+        }
+        with open(filename, 'w') as f:
+            json.dump(data, f, separators=(',', ':'))
+
+    @classmethod
+    def load(cls, filename):
+        with open(filename) as f:
+            data = json.load(f)
+        if data.get('version') != FORMAT_VERSION:
+            raise ValueError(f'{filename}: unsupported tree format.')
+        spec = mm.GameSpec(data['positions'], data['colours'],
+                           data['max_guesses'], data['max_codes'],
+                           data['seed'])
+        moves = {bytes.fromhex(k): v for k, v in data['moves'].items()}
+        return cls(moves, spec, data['strategy'])
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Build the strategy tree of the Mastermind solver.")
+    parser.add_argument('-o', '--output', type=str, default='knuth_tree.json',
+                        help='Output file.')
+    parser.add_argument('-g', '--guess', type=str, default=None,
+                        help='First guess. Defaults to rrgg.')
+    parser.add_argument('-n', '--positions', type=int, default=4,
+                        help='Number of pegs per code.')
+    parser.add_argument('--colours', type=str, default=mm.PEGS,
+                        help='Available colours, one letter each.')
+    parser.add_argument('-s', '--strategy', choices=list(mm.STRATEGIES),
+                        default='minimax',
+                        help='How guesses are scored.')
+    parser.add_argument('--backend', choices=['python', 'numpy'],
+                        default='python',
+                        help='Minimax scoring backend.')
+    args = parser.parse_args()
+
+    spec = mm.GameSpec(args.positions, args.colours)
+    tree = StrategyTree.build(spec, args.guess, mm.ResponseTable(spec),
+                              args.backend, args.strategy)
+    tree.save(args.output)
+    print(f'Saved {len(tree)} moves to {args.output}.')
+
+
+if __name__ == '__main__':
+    main()
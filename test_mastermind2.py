@@ -0,0 +1,602 @@
+import time
+import argparse
+
+import pytest
+
+import mastermind2 as mm
+
+
+def test_response_table():
+    table = mm.ResponseTable()
+    spec = table.spec
+    assert table.size == 1296
+    assert table.verify()
+    r = table.lookup(spec.encode('rrbb'), spec.encode('bggr'))
+    assert spec.unpack_response(r) == (0, 2)
+
+
+def test_response_table_file(tmp_path):
+    import pickle
+
+    filename = tmp_path / 'table.bin'
+    table = mm.ResponseTable.load(filename)
+    assert table.filename == filename and table.size == 1296
+    assert bytes(table.data) == mm.ResponseTable().data.tobytes()
+    other = mm.ResponseTable.load(filename)
+    assert other.lookup(5, 700) == table.lookup(5, 700)
+    # Sent by file name
+    assert len(pickle.dumps(table)) < 1000
+    assert bytes(pickle.loads(pickle.dumps(table)).data) == bytes(table.data)
+
+    # Rebuilt for another board, a truncated file or another version
+    spec = mm.GameSpec(3, 'rgb')
+    assert mm.ResponseTable.load(filename, spec).verify()
+    filename.write_bytes(filename.read_bytes()[:-1])
+    assert mm.ResponseTable.load(filename, spec).verify()
+    data = bytearray(filename.read_bytes())
+    data[4] += 1
+    filename.write_bytes(data)
+    assert mm.ResponseTable.load(filename, spec).verify()
+    assert filename.read_bytes()[4] == mm.ResponseTable.VERSION
+
+
+def test_get_responses(monkeypatch):
+    # Against the whole code space, on a board where it is cheap, then
+    # against the table, checked against `get_response` above.
+    for np in [mm.np, None]:
+        monkeypatch.setattr(mm, 'np', np)
+        mm._code_counts.cache_clear()
+        spec = mm.GameSpec(3, 'rgbcy')
+        codes = list(range(spec.num_codes))
+        for g in codes:
+            expected = [spec.pack_response(mm.get_response(spec.decode(g),
+                                                           spec.decode(c)))
+                        for c in codes]
+            assert mm.get_responses(g, codes, spec) == expected
+        table = mm.ResponseTable()
+        codes = list(range(table.size))
+        for g in codes:
+            assert mm.get_responses(g, codes) == list(table.row(g))
+        assert mm.get_responses(0, []) == []
+    mm._code_counts.cache_clear()
+
+
+def test_code_set():
+    S = mm.CodeSet()
+    assert len(S) == 1296
+    assert list(S) == list(range(1296))
+    S.discard(5)
+    assert 5 not in S and 6 in S and len(S) == 1295
+    T = mm.CodeSet.from_indices([3, 700, 1295])
+    assert list(T) == [3, 700, 1295]
+    assert T.copy() == T
+
+
+def test_table_same_guesses():
+    table = mm.ResponseTable()
+    spec = table.spec
+    for code in ['ycmb', 'rrrr', 'bgmm']:
+        S, T = mm.CodeSet(), mm.CodeSet()
+        S1, T1 = S.copy(), T.copy()
+        guess = spec.encode('rrgg')
+        while spec.decode(guess) != code:
+            resp = mm.get_response(spec.decode(guess), code)
+            mm.prune(S, T, guess, resp, verbose=False)
+            mm.prune(S1, T1, guess, resp, verbose=False, table=table)
+            assert S == S1 and T == T1
+            guess = mm.get_next_guess(S, T, verbose=False)
+            assert guess == mm.get_next_guess(S1, T1, False, table)
+
+
+def test_numpy_backend():
+    pytest.importorskip('numpy')
+    table = mm.ResponseTable()
+    S, T = mm.CodeSet(), mm.CodeSet()
+    mm.prune(S, T, table.spec.encode('rrgg'), (0, 1), False, table)
+    assert mm.CodeSet.from_mask(S.mask()) == S
+    expected = mm.get_next_guess(S, T, False, table)
+    assert mm.get_next_guess(S, T, False, backend='numpy') == expected
+    assert mm.get_next_guess(S, T, False, table, backend='numpy') == expected
+
+
+def test_game_spec():
+    spec = mm.GameSpec(5, 'rgbcymwp')
+    assert spec.num_codes == 32768
+    assert spec.default_guess() == 'rrggg'
+    assert spec.decode(spec.encode('wpyrr')) == 'wpyrr'
+    assert spec.unpack_response(spec.pack_response((2, 3))) == (2, 3)
+    assert not spec.is_valid_response((4, 1))
+    assert spec.is_valid_response((3, 1))
+    table = mm.ResponseTable(mm.GameSpec(3, 'rgbc'))
+    assert table.verify()
+
+    # Specs of another copy of the module, as when run as a script
+    import importlib.util
+    module_spec = importlib.util.spec_from_file_location('script',
+                                                         mm.__file__)
+    main = importlib.util.module_from_spec(module_spec)
+    module_spec.loader.exec_module(main)
+    assert main.CLASSIC == mm.CLASSIC and mm.CLASSIC == main.GameSpec()
+    assert main.CLASSIC != mm.SUPER
+
+
+def test_super_mastermind():
+    spec = mm.SUPER
+    code = 'wpyrr'
+    S, T = mm.CodeSet(spec), mm.CodeSet(spec)
+    guess = spec.default_guess()
+    for _ in range(12):
+        resp = mm.get_response(guess, code)
+        if spec.is_solved(resp):
+            break
+        mm.prune(S, T, spec.encode(guess), resp, False)
+        guess = spec.decode(mm.get_next_guess(S, T, False))
+    assert guess == code
+
+
+def test_strategy_tree(tmp_path):
+    from strategy_tree import StrategyTree
+    table = mm.ResponseTable()
+    tree = StrategyTree.build(table=table)
+    assert tree.first_guess == 'rrgg'
+    filename = tmp_path / 'tree.json'
+    tree.save(filename)
+    tree = StrategyTree.load(filename)
+    spec = tree.spec
+    for code in ['ycmb', 'bgmm']:
+        S, T = mm.CodeSet(), mm.CodeSet()
+        guess, responses = spec.encode('rrgg'), []
+        while spec.decode(guess) != code:
+            resp = mm.get_response(spec.decode(guess), code)
+            responses.append(resp)
+            mm.prune(S, T, guess, resp, False, table)
+            guess = mm.get_next_guess(S, T, False, table)
+            assert tree.next_guess(responses) == guess
+    assert tree.next_guess([(0, 0), (4, 0)]) is None
+
+    # Once a guess is not the tree's, the session leaves the tree
+    session = mm.GameSession(table=table, tree=tree, code='ycmb')
+    session.submit_guess('bbbb')
+    S, T = mm.CodeSet(), mm.CodeSet()
+    mm.prune(S, T, spec.encode('bbbb'), (1, 0), False, table)
+    assert session.next_guess() == spec.decode(
+        mm.get_next_guess(S, T, False, table))
+    assert spec.encode(session.next_guess()) != tree.moves[bytes(
+        session.responses)]
+
+
+def test_solver_options(tmp_path):
+    # The table is built for the board of the tree, with its strategy
+    from strategy_tree import StrategyTree
+    spec = mm.GameSpec(3, 'rgbc')
+    filename = tmp_path / 'tree.json'
+    StrategyTree.build(spec, strategy='entropy').save(filename)
+    parser = argparse.ArgumentParser()
+    mm.add_solver_arguments(parser)
+    args = parser.parse_args(['-t', '--tree', str(filename)])
+    board, options = mm.solver_options(args)
+    assert board == options['tree'].spec == options['table'].spec == spec
+    assert options['strategy'] == 'entropy'
+
+
+def test_benchmark():
+    import benchmark
+    stats = benchmark.benchmark(codes=['ycmb', 'rrgg', 'bgmm'],
+                                table=mm.ResponseTable())
+    assert stats['games'] == 3 and stats['unsolved'] == 0
+    assert stats['guesses']['rrgg'] == 1
+    assert stats['guesses']['ycmb'] == 5
+    assert stats['moves'] == sum(stats['guesses'].values()) - 3
+
+
+def test_solve_batch():
+    import batch
+    table = mm.ResponseTable()
+    codes = ['ycmb', 'rrgg', 'bgmm', 'xyz']
+    results = list(batch.solve_batch(codes, workers=2, chunksize=1,
+                                     table=table))
+    assert [r['code'] for r in results] == codes
+    assert results[0]['guesses'][-1] == 'ycmb'
+    assert results[0]['count'] == 5 and results[0]['solved']
+    assert results[1]['responses'] == [(4, 0)]
+    assert 'error' in results[3]
+    assert results[:3] == list(batch.solve_batch(codes[:3], workers=0,
+                                                 table=table))
+    unordered = batch.solve_batch(codes, workers=2, ordered=False,
+                                  table=table)
+    assert sorted(r['code'] for r in unordered) == sorted(codes)
+
+
+def test_guess_cache(tmp_path):
+    from cache import GuessCache
+    table = mm.ResponseTable()
+    filename = tmp_path / 'guesses.cache'
+    cache = GuessCache(maxsize=3, filename=filename)
+    result = mm.mastermind(code='ycmb', table=table, cache=cache, quiet=True)
+    assert (cache.hits, cache.misses, len(cache)) == (0, 4, 3)
+    cache.save()
+    cache = GuessCache(filename=filename)
+    assert len(cache) == 3
+    again = mm.mastermind(code='ycmb', table=table, cache=cache, quiet=True)
+    assert again.guesses == result.guesses
+    assert (cache.hits, cache.misses) == (3, 1)
+
+
+def test_incremental_partitions():
+    np = pytest.importorskip('numpy')
+    table = mm.ResponseTable()
+    for code in ['ycmb', 'bgmm', 'rrrr', 'mcyb']:
+        expected = mm.mastermind(code=code, table=table, quiet=True)
+        result = mm.mastermind(code=code, table=table, quiet=True,
+                               incremental=True)
+        assert result.guesses == expected.guesses
+
+    # Turns after the first narrow the responses kept, evaluating none
+    turns, incremental_turns = [], []
+    mm.mastermind(code='bgmm', table=table, quiet=True, on_turn=turns.append)
+    mm.mastermind(code='bgmm', table=table, quiet=True, incremental=True,
+                  on_turn=incremental_turns.append)
+    evaluations = [t.score_evaluations for t in turns]
+    incremental = [t.score_evaluations for t in incremental_turns]
+    assert incremental[0] == evaluations[0] > 0
+    assert incremental[1:] == [0] * (len(incremental) - 1)
+    assert sum(incremental) < sum(evaluations)
+
+    for t in [table, None]:
+        partitions = mm.Partitions(table=t)
+        S, T = mm.CodeSet(), mm.CodeSet()
+        for guess, resp in [('rrgg', (0, 1)), ('gbcc', (1, 0))]:
+            mm.prune(S, T, table.spec.encode(guess), resp, False, table)
+            hist = partitions.update(T, S)
+            fresh = mm.partition_histograms(T.indices(), S.indices(), table)
+            assert np.array_equal(hist, fresh)
+
+
+@pytest.mark.parametrize('strategy', list(mm.STRATEGIES))
+def test_strategies(strategy):
+    table = mm.ResponseTable()
+    S, T = mm.CodeSet(), mm.CodeSet()
+    mm.prune(S, T, table.spec.encode('rrgg'), (1, 1), False, table)
+    expected = mm.get_next_guess(S, T, False, table, strategy=strategy)
+    assert mm.get_next_guess(S, T, False, strategy=strategy) == expected
+    if mm.np is not None:
+        assert mm.get_next_guess(S, T, False, backend='numpy',
+                                 strategy=strategy) == expected
+
+
+def test_game_session():
+    session = mm.GameSession(code='ycmb')
+    while not session.solved:
+        guess = session.next_guess()
+        assert session.submit_guess(guess) == mm.get_response(guess, 'ycmb')
+    assert len(session) <= 5
+    assert session.history()[-1] == ('ycmb', (4, 0))
+    with pytest.raises(ValueError):
+        session.submit_guess('ycmb')
+
+    # Keeper answering the responses of the code 'bgmm'
+    session = mm.GameSession(incremental=mm.np is not None)
+    session.submit_guess('rrgg')
+    state = session.snapshot()
+    with pytest.raises(ValueError):
+        session.submit_response((3, 1))
+    session.submit_response(mm.get_response('rrgg', 'bgmm'))
+    guess = session.next_guess()
+    other = session.copy()
+    session.restore(state)
+    assert session.pending is not None and len(session) == 0
+    session.submit_response(mm.get_response('rrgg', 'bgmm'))
+    assert session.next_guess() == guess
+    assert other.S == session.S
+
+    # Undo on a copy sets S back to the codes left before the move
+    S = other.S.copy()
+    other.submit_guess(guess)
+    other.submit_response(mm.get_response(guess, 'bgmm'))
+    other.candidates()
+    other = other.copy()
+    other.undo()
+    assert other.S == S and other.pruned == 1
+
+
+def test_server():
+    import asyncio
+    from server import GameServer
+    from loadtest import load_test
+
+    async def run():
+        server = GameServer(workers=0, table=mm.ResponseTable())
+        host, port = await server.start('127.0.0.1', 0)
+        try:
+            stats = await load_test(host, port, games=20, concurrency=5,
+                                    seed=1)
+            reader, writer = await asyncio.open_connection(host, port)
+            lines = []
+            for cmd in ['NEXT', 'KEEP', 'GUESS rrgg', 'GUESS rrgx', 'BREAK',
+                        'NEXT', 'RESPONSE 0 0', 'NEXT', 'RESPONSE 0 0',
+                        'NEXT', 'RESPONSE 0 0', 'QUIT']:
+                writer.write(cmd.encode() + b'\n')
+                if cmd != 'QUIT':
+                    lines.append((await reader.readline()).decode().strip())
+            writer.close()
+        finally:
+            await server.close()
+        return stats, lines, server.games
+
+    stats, lines, games = asyncio.run(run())
+    assert stats['games'] == games == 20
+    assert stats['mean'] <= 5
+    assert lines[0].startswith('ERR') and lines[1] == 'OK'
+    assert lines[2].startswith('RESPONSE') and lines[3].startswith('ERR')
+    # No colour of rrgg nor of bbcy leaves mmmm, checked by the worker
+    assert lines[5:10] == ['GUESS rrgg', 'OK', 'GUESS bbcy', 'OK',
+                           'GUESS mmmm']
+    assert lines[10].startswith('ERR Response (0, 0) contradicts')
+
+    async def backpressure():
+        server = GameServer(workers=0, max_pending=1, timeout=0.05)
+        try:
+            with pytest.raises(asyncio.TimeoutError):
+                await server.run(time.sleep, 0.2)
+            # The slot is held until the call is done
+            assert server.pending.locked()
+            assert await server.run(abs, -1) == 1
+        finally:
+            await server.close()
+
+    asyncio.run(backpressure())
+
+
+def test_turn_stats(tmp_path):
+    from cache import GuessCache
+
+    turns = []
+    cache = GuessCache()
+    for _ in range(2):
+        mm.mastermind(code='ycmb', quiet=True, cache=cache,
+                      on_turn=turns.append)
+    first, last = turns[0], turns[len(turns) // 2]
+    assert first.turn == 2 and first.S == 256 and first.T == 1295
+    assert first.removed == 1040 and first.prune_evaluations == 1296
+    assert first.score_evaluations == 256 * 1295
+    assert first.source == 'solver' and last.source == 'cache'
+
+    with mm.profile(tmp_path / 'game.prof'):
+        mm.mastermind(code='ycmb', quiet=True, table=mm.ResponseTable())
+    assert (tmp_path / 'game.prof').stat().st_size > 0
+
+
+def test_time_budget():
+    table = mm.ResponseTable()
+    spec = table.spec
+    for backend in ['python', 'numpy'] if mm.np else ['python']:
+        turns = []
+        session = mm.GameSession(table=table, backend=backend, code='ycmb',
+                                 time_budget=0, on_turn=turns.append)
+        session.submit_guess('rrrr')
+        guess = session.next_guess()
+        S, T = session.candidates()
+        # Only the first guesses, of S, were scored in time
+        assert 0 < turns[0].evaluated < 1
+        assert turns[0].score_evaluations < len(S) * len(T)
+        assert spec.encode(guess) in S
+
+        turns = []
+        session = mm.GameSession(table=table, backend=backend, code='ycmb',
+                                 time_budget=60, on_turn=turns.append)
+        result = mm.mastermind(code='ycmb', quiet=True, table=table,
+                               backend=backend)
+        done = []
+
+        def progress(i, n):
+            done.append(i / n)
+
+        for guess in result.guesses:
+            assert session.next_guess(progress=progress) == guess
+            session.submit_guess(guess)
+        assert all(t.evaluated == 1 for t in turns)
+        # All the guesses scored, progress reaches 100%
+        assert done[-1] == 1
+
+    done = []
+    mm.get_next_guess(S, T, False, progress=progress)
+    assert done[-1] == 1
+
+
+def test_sharded_scoring(tmp_path):
+    from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+    table = mm.ResponseTable.load(tmp_path / 'table.bin')
+    settings = [dict(table=table), dict(strategy='entropy')]
+    if mm.np is not None:
+        settings.append(dict(backend='numpy', strategy='parts'))
+    with ThreadPoolExecutor(3) as threads, ProcessPoolExecutor(2) as processes:
+        for kwargs in settings:
+            for code in ['ycmb', 'rrrr', 'bgmm']:
+                expected = mm.mastermind(code=code, quiet=True, **kwargs)
+                for executor in [threads, processes]:
+                    result = mm.mastermind(code=code, quiet=True,
+                                           executor=executor, **kwargs)
+                    assert result.guesses == expected.guesses
+
+
+def test_consistent_codes():
+    import random
+
+    spec = mm.GameSpec(4, 'rgbcy')
+    rng = random.Random(0)
+    for _ in range(20):
+        code = spec.random_code(rng)
+        history = [(g, mm.get_response(g, code))
+                   for g in [spec.random_code(rng) for _ in range(3)]]
+        expected = [''.join(c) for c in spec.codes()
+                    if all(mm.get_response(g, ''.join(c)) == r
+                           for g, r in history)]
+        assert list(mm.consistent_codes(spec, history)) == expected
+        assert (sorted(mm.consistent_codes(spec, history, rng)) ==
+                sorted(expected))
+
+    # 10^8 codes, never enumerated
+    spec = mm.GameSpec(8, 'rgbcymwpok', max_guesses=20, max_codes=20)
+    session = mm.GameSession(spec, 'bkgygppp', lazy=True)
+    for _ in range(12):
+        session.submit_guess(session.next_guess())
+        if session.solved:
+            break
+    assert session.solved and session.S is None
+
+    session = mm.GameSession(mm.CLASSIC, lazy=True)
+    session.submit_guess('rrgg')
+    session.submit_response((0, 0))
+    session.submit_guess('rrrr')
+    assert session.is_consistent((0, 0))
+    with pytest.raises(ValueError):
+        session.submit_response((1, 0), check=True)
+    result = mm.mastermind(code='ycmb', quiet=True, lazy=True)
+    assert result.guesses[-1] == 'ycmb'
+
+
+def test_evaluate():
+    from benchmark import benchmark
+    from evaluate import evaluate, evaluate_openings, summary
+    from strategy_tree import StrategyTree
+
+    spec = mm.GameSpec(4, 'rgbc')
+    table = mm.ResponseTable(spec)
+    for strategy in ['minimax', 'entropy']:
+        stats = benchmark(spec, table=table, strategy=strategy)
+        expected = {int(n): num for n, num in stats['distribution'].items()}
+        assert evaluate(spec, table=table, strategy=strategy) == expected
+        assert evaluate(spec, strategy=strategy) == expected
+    tree = StrategyTree.build(spec, table=table)
+    assert evaluate(spec, tree=tree) == evaluate(spec, table=table)
+
+    results = evaluate_openings(spec, table=table)
+    assert list(results) == ['rrrr', 'rrrg', 'rrgg', 'rrgb', 'rgbc']
+    assert evaluate_openings(spec, table=table, workers=2) == results
+    assert results['rrgg'] == evaluate(spec, 'rrgg', table=table)
+    assert all(summary(d)[0] == 256 for d in results.values())
+
+
+def test_optimal_search():
+    pytest.importorskip('numpy')
+    from benchmark import benchmark
+    from optimal import Search, first_guesses
+    from strategy_tree import StrategyTree
+
+    spec = mm.GameSpec(3, 'rgbc')
+    assert [spec.decode(g) for g in first_guesses(spec)] == [
+        'rrr', 'rrg', 'rgb']
+    table = mm.ResponseTable(spec)
+    cost, tree = Search(spec, table, width=0, levels=10).build()
+    stats = benchmark(spec, table=table, tree=tree)
+    assert stats['unsolved'] == 0
+    assert sum(stats['guesses'].values()) == cost
+    greedy = StrategyTree.build(spec, tree.first_guess, table,
+                                strategy='expected')
+    stats = benchmark(spec, table=table, tree=greedy)
+    assert cost <= sum(stats['guesses'].values())
+
+
+def test_symmetry():
+    spec = mm.CLASSIC
+    S, T = mm.CodeSet(), mm.CodeSet()
+    reps = mm.orbit_representatives(T.indices(), mm.symmetries(S, T))
+    assert [spec.decode(g) for g in reps] == [
+        'rrrr', 'rrrg', 'rrgg', 'rrgb', 'rgbc']
+
+    table = mm.ResponseTable()
+    for code in ['ycmb', 'rrrr', 'bgmm', 'cyyc']:
+        for strategy in ['minimax', 'entropy']:
+            plain = mm.mastermind(code=code, quiet=True, table=table,
+                                  strategy=strategy)
+            reduced = mm.mastermind(code=code, quiet=True, table=table,
+                                    strategy=strategy, symmetry=True)
+            assert plain.guesses == reduced.guesses
+
+
+def test_game_log(tmp_path):
+    import gamelog
+
+    filename = tmp_path / 'games.jsonl'
+    log = gamelog.GameLog(filename)
+    for code in ['ycmb', 'rrrr']:
+        mm.mastermind(code=code, quiet=True, log=log)
+    # keeper game, the code is not logged
+    session = mm.GameSession(log=log)
+    session.submit_guess('rrgg')
+    session.submit_response((0, 1))
+    session.submit_guess('bbbb')
+    session.submit_response((4, 0))
+    log.close()
+
+    games = list(gamelog.games(gamelog.read_records([filename])))
+    assert len(games) == 3
+    assert all(gamelog.validate(*game) == [] for game in games)
+    stats = gamelog.aggregate(gamelog.read_records([filename]))
+    assert stats['solved'] == 3 and stats['unfinished'] == 0
+
+    start, moves, end = games[2]
+    moves[1]['response'] = [0, 0]
+    assert gamelog.validate(start, moves, end)
+
+    # A move with no start, an undo with no move, a truncated line
+    with open(filename, 'a') as f:
+        f.write('{"game": "a", "event": "move", "move": 1, '
+                '"guess": "rrgg", "response": [0, 0]}\n'
+                '{"game": "b", "event": "start", "positions": 4, '
+                '"colours": "rgbcym", "code": "ycmb"}\n'
+                '{"game": "b", "event": "undo"}\n'
+                '{"game": "c", "eve')
+    games = list(gamelog.games(gamelog.read_records([filename])))
+    assert [len(gamelog.validate(*game)) > 0 for game in games] == [
+        False, False, False, True, True, True]
+    stats = gamelog.aggregate(gamelog.read_records([filename]))
+    assert stats['invalid'] == 2 and stats['unfinished'] == 1
+
+
+def test_keeper_consistency(tmp_path):
+    import gamelog
+
+    log = gamelog.GameLog(tmp_path / 'games.jsonl')
+    for table in [None, mm.ResponseTable()]:
+        session = mm.GameSession(table=table, log=log)
+        with pytest.raises(ValueError):
+            session.possible_responses()
+        session.submit_guess('rrgg')
+        session.submit_response((0, 0), check=True)
+        S = session.candidates()[0].copy()
+        session.submit_guess('rrrr')
+        assert session.possible_responses() == [(0, 0)]
+        with pytest.raises(ValueError):
+            session.submit_response((1, 0), check=True)
+        session.submit_response((1, 0))
+        session.submit_guess('cccc')
+        assert session.possible_responses() == []
+
+        # take back the contradiction, S is set back without pruning
+        session.undo()
+        session.undo()
+        assert session.candidates()[0] == S
+        session.submit_guess('bbbb')
+        session.submit_response((2, 0), check=True)
+    log.close()
+    games = list(gamelog.games(gamelog.read_records([log.filename])))
+    assert [len(moves) for _, moves, _ in games] == [2, 2]
+    assert all(gamelog.validate(*game) == [] for game in games)
+
+    # A lazy keeper game on a huge board is checked without its codes
+    spec = mm.GameSpec(8, 'rgbcymwpok')
+    log = gamelog.GameLog(tmp_path / 'lazy.jsonl')
+    session = mm.GameSession(spec, lazy=True, log=log)
+    for guess in ['rrggbbcc', 'yymmwwpp', 'rgbcymwp']:
+        session.submit_guess(guess)
+        session.submit_response(mm.get_response(guess, 'okrgbcym'))
+    log.close()
+    (game,) = gamelog.games(gamelog.read_records([log.filename]))
+    assert gamelog.validate(*game) == []
+    # No y, m, w or p, yet all the colours of rgbcymwp
+    game[1][1]['response'] = [0, 0]
+    game[1][2]['response'] = [0, 8]
+    assert gamelog.validate(*game) == [
+        'move 3: no code gives these responses']
@@ -1,38 +1,183 @@
-from mastermind import PEGS
-from mastermind import response
+"""
+Conformance and performance tests of the solver.
+
+`get_response` is checked over all pairs of codes of the classic board,
+against its invariants and against `test_responses.txt`, a reference
+of random pairs written in the format of the tests of
+https://github.com/NathanDuran/Mastermind-Five-Guess-Algorithm by
+
+    python test_response.py
+
+The time and memory budgets fail the tests when a change makes the
+solver much slower or larger. They are a few times the figures of a
+laptop, set MASTERMIND_BUDGET_SCALE to scale them on slower machines.
+"""
+
+import os
+import time
+import random
+import tracemalloc
+from collections import Counter
+
+import pytest
+
+import mastermind2 as mm
+from mastermind2 import get_response
+from evaluate import evaluate
+
+FIXTURE = os.path.join(os.path.dirname(__file__), 'test_responses.txt')
+# Colours of the reference, as in the C++ tests
+DIGITS = '123456'
+
+BUDGET_SCALE = float(os.environ.get('MASTERMIND_BUDGET_SCALE', 1))
 
 
 def test_response():
-    PEGS = 'rgbymc'
-    assert response('rrrr', 'gggg') == (0, 0)
-    assert response('rrrb', 'rgbb') == (2, 0)
-    assert response('rrbb', 'bggr') == (0, 2)
-    assert response('rrcr', 'ccrc') == (0, 2)
-    assert response('rrcr', 'ggrg') == (0, 1)
-    assert response('cmyb', 'cmyb') == (4, 0)
-    assert response('rrbb', 'bbrr') == (0, 4)
-    assert response('rrcr', 'rgrg') == (1, 1)
-    assert response('rrrr', 'rrrr') == (4, 0)
-    assert response('rrgr', 'ggrr') == (1, 2)
-
-
-def test_cpp():
-    """Benchmark using
-    https://github.com/NathanDuran/Mastermind-Five-Guess-Algorithm/blob/master/Five-Guess-Algorithm.cpp
-    """
-    PEGS = '123456'
-    fn = r"\\wsl.localhost\Ubuntu\home\rafros\git\Mastermind-Five-Guess-Algorithm\tests.txt"
-    with open(fn) as f:
-        games = [[i.strip() for i in g ] 
-             for g in [line.split(',') 
-             for line in f.readlines()]] 
+    assert get_response('rrrr', 'gggg') == (0, 0)
+    assert get_response('rrrb', 'rgbb') == (2, 0)
+    assert get_response('rrbb', 'bggr') == (0, 2)
+    assert get_response('rrcr', 'ccrc') == (0, 2)
+    assert get_response('rrcr', 'ggrg') == (0, 1)
+    assert get_response('cmyb', 'cmyb') == (4, 0)
+    assert get_response('rrbb', 'bbrr') == (0, 4)
+    assert get_response('rrcr', 'rgrg') == (1, 1)
+    assert get_response('rrrr', 'rrrr') == (4, 0)
+    assert get_response('rrgr', 'ggrr') == (1, 2)
+
+
+def reference_response(guess, code):
+    """Blacks and whites by their definition: blacks are the positions
+    of the same colour, blacks plus whites the colours in common."""
+    blacks = sum(g == c for g, c in zip(guess, code))
+    common = sum((Counter(guess) & Counter(code)).values())
+    return blacks, common - blacks
 
+
+def write_fixture(filename=FIXTURE, num_pairs=2000, seed=0):
+    spec = mm.GameSpec(4, DIGITS)
+    rng = random.Random(seed)
+    with open(filename, 'w') as f:
+        f.write('# guess, code, response: one B per black, one W per white\n')
+        for _ in range(num_pairs):
+            guess, code = spec.random_code(rng), spec.random_code(rng)
+            blacks, whites = reference_response(guess, code)
+            f.write(f"{guess}, {code}, {'B' * blacks + 'W' * whites}\n")
+
+
+def test_fixture():
+    with open(FIXTURE) as f:
+        games = [[i.strip() for i in line.split(',')]
+                 for line in f if not line.startswith('#')]
+    assert len(games) == 2000
     for guess, code, r in games:
-        r0 = r.count('B'), r.count('W')
-        r1 = response(guess, code)
-        #print(guess, code, r0, r1, end='\r')
-        assert r0 == r1
+        assert get_response(guess, code) == (r.count('B'), r.count('W'))
+
+
+@pytest.fixture(scope='module')
+def all_responses():
+    """Responses of all pairs of codes of the classic board, indexed
+    as [guess][code]."""
+    codes = [''.join(c) for c in mm.CLASSIC.codes()]
+    return codes, [[get_response(g, c) for c in codes] for g in codes]
+
+
+def test_response_invariants(all_responses):
+    spec = mm.CLASSIC
+    codes, responses = all_responses
+    counts = [[c.count(x) for x in spec.colours] for c in codes]
+    for i, (g, row) in enumerate(zip(codes, responses)):
+        for j, (c, (blacks, whites)) in enumerate(zip(codes, row)):
+            assert spec.is_valid_response((blacks, whites))
+            assert responses[j][i] == (blacks, whites)
+            assert blacks == sum(a == b for a, b in zip(g, c))
+            assert blacks + whites == sum(map(min, counts[i], counts[j]))
+            assert spec.is_solved((blacks, whites)) == (i == j)
+
+
+def test_response_permutations(all_responses):
+    # Renaming the colours or moving the positions of both codes alike
+    # gives the same response
+    spec = mm.CLASSIC
+    codes, responses = all_responses
+    rng = random.Random(0)
+    for _ in range(2):
+        colours = dict(zip(spec.colours,
+                           rng.sample(spec.colours, len(spec.colours))))
+        positions = rng.sample(range(spec.positions), spec.positions)
+        image = [spec.encode(''.join(colours[c[p]] for p in positions))
+                 for c in codes]
+        for i, row in enumerate(responses):
+            image_row = responses[image[i]]
+            assert all(image_row[image[j]] == r for j, r in enumerate(row))
+
+
+def test_knuth_five_guesses():
+    # Every code is broken in at most 5 guesses
+    table = mm.ResponseTable()
+    distribution = evaluate(table=table)
+    assert distribution == {1: 1, 2: 6, 3: 62, 4: 533, 5: 694}
+    for code in ['ycmb', 'rrrr', 'mmcy']:
+        assert len(mm.mastermind(code=code, quiet=True).guesses) <= 5
+
+
+def best_time(f, repeat=3):
+    """Shortest of `repeat` wall times of `f()`, in seconds."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        f()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def peak_memory(f):
+    """Peak of the memory allocated by `f()`, in bytes."""
+    tracemalloc.start()
+    try:
+        f()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+@pytest.mark.parametrize('use_table', [False, True])
+def test_prune_budget(use_table):
+    table = mm.ResponseTable() if use_table else None
+    guess = mm.CLASSIC.encode('rrgg')
+
+    def prune():
+        S, T = mm.CodeSet(), mm.CodeSet()
+        mm.prune(S, T, guess, (0, 1), False, table)
+
+    assert best_time(prune) < 0.01 * BUDGET_SCALE
+    assert peak_memory(prune) < 200_000 * BUDGET_SCALE
+
+
+@pytest.mark.parametrize('use_table', [False, True])
+def test_next_guess_budget(use_table):
+    table = mm.ResponseTable() if use_table else None
+    S, T = mm.CodeSet(), mm.CodeSet()
+    mm.prune(S, T, mm.CLASSIC.encode('rrgg'), (1, 1), False, table)
+    assert len(S) == 208
+
+    def next_guess():
+        mm.get_next_guess(S, T, False, table)
+
+    assert best_time(next_guess) < 0.5 * BUDGET_SCALE
+    assert peak_memory(next_guess) < 500_000 * BUDGET_SCALE
+
+
+def test_game_budget():
+    assert peak_memory(mm.ResponseTable) < 4_000_000 * BUDGET_SCALE
+    table = mm.ResponseTable()
+    for kwargs in [{}, {'table': table}]:
+        def game():
+            mm.mastermind(code='ycmb', quiet=True, **kwargs)
+
+        assert best_time(game) < 1.5 * BUDGET_SCALE
+        assert peak_memory(game) < 1_000_000 * BUDGET_SCALE
+
 
 if __name__ == '__main__':
-    test_response()
-    test_cpp()
\ No newline at end of file
+    write_fixture()
+    print(f'Wrote {FIXTURE}.')